@@ -1,6 +1,13 @@
+import logging
+
 from django.apps import AppConfig
 
 
 class VoiceAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Voice_App'
+
+    def ready(self):
+        from src.config.logging_setup import enqueue_handlers
+
+        enqueue_handlers(logging.getLogger("voice_app"))
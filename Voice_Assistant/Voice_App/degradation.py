@@ -0,0 +1,214 @@
+"""Latency-SLO-driven degradation for api_ask.
+
+- StreamWatchdog reads the upstream stream on a background thread so the view can
+  say a filler line when the first token is slow and give up at a deadline.
+- LatencyTracker keeps a rolling p95 of upstream turn times; `budget()` shrinks
+  max_tokens and prompt context as it rises.
+- CircuitBreaker stops calling upstream after repeated failures and lets a single
+  trial request through once the cool-down has passed.
+
+Thresholds come from settings.VOICE_SLO. Breaker and latency state are per worker
+process, like the upstream connection pool they protect.
+"""
+import hashlib
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from Voice_App.retrieval import kb_template_answer
+
+
+FILLER_TEXT = "One moment, let me check."
+APOLOGY_TEXT = "Sorry, I'm having trouble answering right now. Please try again in a moment."
+
+
+def slo(name):
+    return settings.VOICE_SLO[name]
+
+
+# ------------------------------ CIRCUIT BREAKER ------------------------------
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold, reset_after_s):
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a request may go upstream now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # Let one trial request through per cool-down; a half-open trial
+            # that never reported back expires, so the breaker cannot stick
+            if time.monotonic() - self.opened_at >= self.reset_after_s:
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+# ------------------------------ LATENCY ------------------------------
+class LatencyTracker:
+    def __init__(self, window=50, min_samples=5):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def p95(self):
+        if len(self._samples) < self.min_samples:
+            return None
+        return float(np.percentile(np.fromiter(self._samples, dtype=np.float64), 95))
+
+
+class Guard:
+    def __init__(self):
+        self.breaker = CircuitBreaker(slo("BREAKER_FAILURES"), slo("BREAKER_RESET_S"))
+        self.latency = LatencyTracker()
+
+    def budget(self):
+        """Generation limits for the next turn given the current rolling p95."""
+        p95 = self.latency.p95()
+        target = slo("P95_TARGET_S")
+        if p95 is None or p95 <= target:
+            return {"level": "normal", "max_tokens": 80, "history": 6, "retrieval": False}
+        if p95 <= 2 * target:
+            return {"level": "reduced", "max_tokens": 50, "history": 4, "retrieval": True}
+        return {"level": "minimal", "max_tokens": 32, "history": 1, "retrieval": True}
+
+
+_guard = None
+
+
+def get_guard():
+    global _guard
+    if _guard is None:
+        _guard = Guard()
+    return _guard
+
+
+def reset_guard():
+    global _guard
+    _guard = None
+
+
+# ------------------------------ UPSTREAM WATCHDOG ------------------------------
+class StreamWatchdog:
+    """Iterate an upstream completion stream on a background thread.
+
+    `events()` yields ("chunk", text) as content arrives, ("slow", None) once if no
+    token came within `filler_after_s`, and ends with ("end", None),
+    ("error", exc) or ("timeout", None).
+    """
+
+    def __init__(self, open_stream):
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._stream = None
+        self._thread = threading.Thread(target=self._run, args=(open_stream,), name="StreamWatchdog", daemon=True)
+        self._thread.start()
+
+    def _run(self, open_stream):
+        try:
+            self._stream = stream = open_stream()
+            if self._cancelled.is_set():
+                stream.close()
+                return
+            for chunk in stream:
+                if self._cancelled.is_set():
+                    stream.close()
+                    return
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self._queue.put(("chunk", chunk.choices[0].delta.content))
+            self._queue.put(("end", None))
+        except Exception as e:
+            self._queue.put(("error", e))
+
+    def cancel(self):
+        """Stop reading and release the upstream connection."""
+        self._cancelled.set()
+        stream = self._stream
+        if stream is None:
+            return
+        try:
+            # close() alone does not wake a reader blocked in recv(); shutting the
+            # socket down does, and the reader then exits through its except
+            network_stream = stream.response.extensions.get("network_stream")
+            if network_stream is not None:
+                network_stream.get_extra_info("socket").shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+        stream.close()
+
+    def events(self, filler_after_s, first_token_deadline_s, stall_s):
+        started = time.monotonic()
+        got_first = slow_sent = False
+        while True:
+            if got_first:
+                wait = stall_s
+            elif not slow_sent:
+                wait = filler_after_s - (time.monotonic() - started)
+            else:
+                wait = first_token_deadline_s - (time.monotonic() - started)
+
+            try:
+                kind, value = self._queue.get(timeout=max(wait, 0))
+            except queue.Empty:
+                if not got_first and not slow_sent and filler_after_s < first_token_deadline_s:
+                    slow_sent = True
+                    yield "slow", None
+                    continue
+                self.cancel()
+                yield "timeout", None
+                return
+
+            yield kind, value
+            if kind != "chunk":
+                return
+            got_first = True
+
+
+# ------------------------------ FALLBACK ANSWERS ------------------------------
+def answer_cache_key(domain, question):
+    normalized = " ".join(question.lower().split())
+    return "answer:" + hashlib.sha256(f"{domain}|{normalized}".encode("utf8")).hexdigest()[:24]
+
+
+def remember_answer(domain, question, answer):
+    cache.set(answer_cache_key(domain, question), answer, timeout=slo("ANSWER_CACHE_TTL_S"))
+
+
+def fallback_answer(domain, question):
+    """Best answer available without upstream: cached, then KB template, then apology."""
+    cached = cache.get(answer_cache_key(domain, question))
+    if cached:
+        return "cache", cached
+    if domain != "normal":
+        templated = kb_template_answer(domain, question)
+        if templated:
+            return "kb", templated
+    return "apology", APOLOGY_TEXT
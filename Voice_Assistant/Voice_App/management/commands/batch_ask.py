@@ -0,0 +1,203 @@
+import asyncio
+import contextlib
+import json
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from openai import AsyncAzureOpenAI
+
+from src.config.config import MyConfig
+from src.speech.speakable import SpeakableSegmenter
+from src.testing.fake_upstream import FakeUpstream, fixed_responder
+from src.tracing.recorder import prompt_hash
+from Voice_App.degradation import remember_answer
+from Voice_App.views import KB_FILES, build_messages
+
+
+def read_questions(paths, domain=None):
+    """(domain, question) pairs from .jsonl files ({"domain", "question"} per line)
+    or plain text files with one question per line, named <domain>.txt."""
+    items = []
+    for path in map(Path, paths):
+        with open(path, encoding="utf8") as f:
+            lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        if path.suffix == ".jsonl":
+            for line in lines:
+                row = json.loads(line)
+                items.append(((row.get("domain") or domain or "normal").lower(), row["question"]))
+        else:
+            items.extend(((domain or path.stem).lower(), q) for q in lines)
+    return items
+
+
+class Command(BaseCommand):
+    help = (
+        "Answer a batch of questions through the api_ask prompt path with bounded "
+        "concurrency; write JSONL with latency and token stats and optionally pre-warm "
+        "the answer cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("questions", nargs="+",
+                            help="<domain>.txt (one question per line) or .jsonl with domain/question")
+        parser.add_argument("--domain", help="Domain for every question, overriding file names")
+        parser.add_argument("--output", default="batch_results.jsonl", help="Results file (JSONL)")
+        parser.add_argument("--concurrency", type=int, default=4, help="Maximum requests in flight")
+        parser.add_argument("--kb-dir", help="Read <domain>.md from here instead of the live KB, "
+                                             "to compare KB versions")
+        parser.add_argument("--max-tokens", type=int, default=80)
+        parser.add_argument("--warm-cache", action="store_true",
+                            help="Store each successful answer in the fallback answer cache "
+                                 "(live KB and real upstream only)")
+        parser.add_argument("--include-usage", action="store_true",
+                            help="Ask for token usage in the stream (Azure API 2024-09-01-preview "
+                                 "or later); otherwise tokens are estimated")
+        parser.add_argument("--fake-upstream", action="store_true",
+                            help="Answer from a local fake upstream instead of Azure (for CI)")
+        parser.add_argument("--fake-ttft-ms", type=int, default=100)
+
+    def handle(self, *args, **options):
+        items = read_questions(options["questions"], options["domain"])
+        if options["warm_cache"] and (options["fake_upstream"] or options["kb_dir"]):
+            # The answer cache is keyed on domain and question only, so these answers
+            # would be served as if they came from the live KB and model
+            raise CommandError("--warm-cache cannot be combined with --fake-upstream or --kb-dir.")
+        if not items:
+            raise CommandError("No questions found.")
+        unknown = {d for d, _ in items} - set(KB_FILES) - {"normal"}
+        if unknown:
+            raise CommandError(f"Unknown domain(s): {', '.join(sorted(unknown))}")
+
+        kb_texts = {}
+        for domain in {d for d, _ in items if d != "normal"}:
+            kb_path = Path(options["kb_dir"]) / f"{domain}.md" if options["kb_dir"] else KB_FILES[domain]
+            if not kb_path.exists():
+                raise CommandError(f"Knowledge base not found: {kb_path}")
+            if options["kb_dir"]:
+                kb_texts[domain] = kb_path.read_text("utf8")
+
+        with contextlib.ExitStack() as stack:
+            if options["fake_upstream"]:
+                upstream = stack.enter_context(FakeUpstream(fixed_responder(
+                    "This is a batch answer from the fake upstream.", ttft_ms=options["fake_ttft_ms"], chunk_ms=5,
+                )))
+                stack.enter_context(upstream.environ())
+            rows = asyncio.run(self.run_all(items, kb_texts, options))
+
+        with open(options["output"], "w", encoding="utf8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+        if options["warm_cache"]:
+            warmed = 0
+            for row in rows:
+                if row["answer"] and not row["error"]:
+                    remember_answer(row["domain"], row["question"], row["answer"])
+                    warmed += 1
+            self.stdout.write(f"Warmed {warmed} cached answers")
+
+        self.stdout.write(json.dumps(self.summarize(rows), indent=2))
+
+    async def run_all(self, items, kb_texts, options):
+        config = MyConfig.envFile()
+        client = AsyncAzureOpenAI(
+            api_key=config["AZURE_OPENAI_KEY"],
+            api_version=config["AZURE_OPENAI_API_VERSION"],
+            azure_endpoint=config["AZURE_OPENAI_ENDPOINT"],
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=30,
+                limits=httpx.Limits(max_connections=options["concurrency"]),
+            ),
+        )
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def bounded(domain, question):
+            async with semaphore:
+                return await self.ask(client, config, domain, question, kb_texts.get(domain), options["max_tokens"],
+                                      options["include_usage"])
+
+        try:
+            return await asyncio.gather(*(bounded(d, q) for d, q in items))
+        finally:
+            await client.close()
+
+    async def ask(self, client, config, domain, question, kb_text, max_tokens, include_usage=False):
+        # Same prompt assembly as api_ask for a first turn at the normal budget
+        messages = build_messages(domain, [{"role": "user", "content": question}], kb_text)
+        prompt_chars = sum(len(m["content"]) for m in messages)
+        row = {
+            "domain": domain,
+            "question": question,
+            "prompt_hash": prompt_hash(messages),
+            "prompt_chars": prompt_chars,
+            "answer": "",
+            "speak": [],
+            "ttft_ms": None,
+            "total_ms": None,
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "usage_source": None,
+            "error": None,
+        }
+
+        started = time.perf_counter()
+        try:
+            stream = await client.chat.completions.create(
+                model=config["AZURE_OPENAI_DEPLOYMENT_NAME"],
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=0.7,
+                stream=True,
+                **({"stream_options": {"include_usage": True}} if include_usage else {}),
+            )
+            async for chunk in stream:
+                if chunk.usage:
+                    row["prompt_tokens"] = chunk.usage.prompt_tokens
+                    row["completion_tokens"] = chunk.usage.completion_tokens
+                    row["usage_source"] = "upstream"
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if row["ttft_ms"] is None:
+                        row["ttft_ms"] = round((time.perf_counter() - started) * 1000)
+                    row["answer"] += chunk.choices[0].delta.content
+        except Exception as e:
+            row["error"] = str(e) or type(e).__name__
+        row["total_ms"] = round((time.perf_counter() - started) * 1000)
+
+        if row["usage_source"] is None:
+            # Roughly 4 characters per token; fine for comparing runs
+            row["prompt_tokens"] = prompt_chars // 4
+            row["completion_tokens"] = len(row["answer"]) // 4
+            row["usage_source"] = "estimate"
+
+        # The units the voice client would synthesise, for filling a TTS cache
+        segmenter = SpeakableSegmenter()
+        row["speak"] = segmenter.feed(row["answer"]) + segmenter.flush()
+        return row
+
+    @staticmethod
+    def summarize(rows):
+        def pct(values, q):
+            return round(float(np.percentile(values, q))) if values else None
+
+        summary = {}
+        for domain in sorted({r["domain"] for r in rows}):
+            domain_rows = [r for r in rows if r["domain"] == domain]
+            ok = [r for r in domain_rows if not r["error"]]
+            ttft = [r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]
+            total = [r["total_ms"] for r in ok]
+            summary[domain] = {
+                "questions": len(domain_rows),
+                "errors": len(domain_rows) - len(ok),
+                "ttft_ms_p50": pct(ttft, 50),
+                "ttft_ms_p95": pct(ttft, 95),
+                "total_ms_p50": pct(total, 50),
+                "total_ms_p95": pct(total, 95),
+                "prompt_chars_mean": round(float(np.mean([r["prompt_chars"] for r in domain_rows]))),
+                "prompt_tokens_total": sum(r["prompt_tokens"] for r in domain_rows),
+                "completion_tokens_total": sum(r["completion_tokens"] for r in domain_rows),
+            }
+        return summary
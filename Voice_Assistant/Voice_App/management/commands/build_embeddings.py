@@ -0,0 +1,51 @@
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from src.retrieval.embeddings import EmbeddingStore, chunk_departments, chunk_markdown, load_embedder
+from Voice_App.views import KB_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        "Chunk knowledge_base/*.md and the scraped department JSON, embed the chunks "
+        "and write a memory-mappable vector matrix plus metadata sidecar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kb-dir", default=str(KB_DIR), help="Directory of <domain>.md files")
+        parser.add_argument("--departments", default=str(settings.BASE_DIR / "patliputra_final.json"),
+                            help="Scraper output (skipped if the file does not exist)")
+        parser.add_argument("--departments-domain", default="healthcare",
+                            help="Domain the department chunks belong to")
+        parser.add_argument("--out", default=str(settings.VOICE_EMBEDDINGS_DIR), help="Output directory")
+        parser.add_argument("--embedder", default=settings.VOICE_EMBEDDER, help="Dotted path of the embedder class")
+        parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+        parser.add_argument("--max-chars", type=int, default=800, help="Maximum characters per chunk")
+
+    def handle(self, *args, **options):
+        max_chars = options["max_chars"]
+        chunks = []
+
+        for md_path in sorted(Path(options["kb_dir"]).glob("*.md")):
+            chunks += chunk_markdown(md_path.read_text("utf8"), md_path.stem, md_path.name, max_chars)
+
+        departments = Path(options["departments"])
+        if departments.exists():
+            data = json.loads(departments.read_text("utf8"))
+            chunks += chunk_departments(data, options["departments_domain"], departments.name, max_chars)
+
+        if not chunks:
+            raise CommandError(f"Nothing to embed in {options['kb_dir']} or {departments}.")
+
+        embedder = load_embedder(options["embedder"])
+        started = time.perf_counter()
+        store = EmbeddingStore.build(chunks, embedder, options["out"], dtype=options["dtype"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Embedded {len(store.chunks)} chunks with {embedder.name} ({embedder.dim}-d, {options['dtype']}) "
+            f"in {time.perf_counter() - started:.2f}s -> {options['out']}"
+        ))
@@ -0,0 +1,123 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from src.testing.fake_upstream import FakeUpstream, ReplayResponder
+from src.tracing.recorder import load_traces, prompt_hash
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay recorded turn traces through api_ask against a local fake upstream "
+        "that reproduces the recorded chunk timing, and compare latencies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("traces", nargs="+", help="traces-*.jsonl files written with VOICE_TRACE_DIR")
+        parser.add_argument("--speed", type=float, default=1.0,
+                            help="Play upstream timing this many times faster (default 1.0)")
+        parser.add_argument("--limit", type=int, help="Replay at most this many turns")
+        parser.add_argument("--output", help="Write one JSON line per replayed turn to this file")
+        parser.add_argument("--no-warmup", action="store_true",
+                            help="Don't replay the first turn once, uncounted, to warm up clients and imports")
+
+    def handle(self, *args, **options):
+        traces = load_traces(options["traces"])
+        if options["limit"]:
+            traces = traces[: options["limit"]]
+        if not traces:
+            raise CommandError("No traces found.")
+
+        responder = ReplayResponder(traces, speed=options["speed"])
+        rows = []
+
+        # In-process test client; cache-backed sessions keep it off the real database,
+        # and throwaway caches keep replayed answers out of the live fallback cache
+        replay_settings = override_settings(
+            ALLOWED_HOSTS=["testserver"],
+            SESSION_ENGINE="django.contrib.sessions.backends.cache",
+            CACHES={
+                alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"replay-{alias}"}
+                for alias in ("default", "sessions")
+            },
+        )
+        with FakeUpstream(responder) as upstream, upstream.environ(), replay_settings:
+            if not options["no_warmup"]:
+                self.replay_one(traces[0], upstream)
+            for trace in traces:
+                rows.append(self.replay_one(trace, upstream))
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+        self.stdout.write(json.dumps(self.summarize(rows, responder.misses), indent=2))
+
+    def replay_one(self, trace, upstream):
+        client = Client()
+        session = client.session
+        session["chat_history"] = trace.get("history") or []
+        if trace.get("domain"):
+            session["selected_domain"] = trace["domain"]
+        session.save()
+
+        n_requests = len(upstream.requests)
+        started = time.perf_counter()
+        first_chunk_at = None
+        output = ""
+        error = None
+
+        response = client.post(
+            "/ask/",
+            data=json.dumps({"text": trace["text"], "domain": trace.get("domain") or ""}),
+            content_type="application/json",
+        )
+        if response.streaming:
+            for raw in response.streaming_content:
+                for line in raw.decode("utf8").splitlines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if "chunk" in event:
+                        first_chunk_at = first_chunk_at or time.perf_counter()
+                        output += event["chunk"]
+                    elif "error" in event:
+                        error = event["error"]
+        else:
+            error = f"HTTP {response.status_code}"
+        finished = time.perf_counter()
+
+        sent = upstream.requests[n_requests:]
+        return {
+            "text": trace["text"],
+            "domain": trace.get("domain"),
+            "prompt_match": bool(sent) and prompt_hash(sent[0].get("messages", [])) == trace["prompt_hash"],
+            "recorded_ttft_ms": trace.get("ttft_ms"),
+            "recorded_total_ms": trace.get("total_ms"),
+            "ttft_ms": round((first_chunk_at - started) * 1000) if first_chunk_at else None,
+            "total_ms": round((finished - started) * 1000),
+            "output_match": output == (trace.get("output") or ""),
+            "error": error,
+        }
+
+    @staticmethod
+    def summarize(rows, misses):
+        def pct(key, q):
+            values = [r[key] for r in rows if r[key] is not None]
+            return round(float(np.percentile(values, q))) if values else None
+
+        summary = {
+            "turns": len(rows),
+            "errors": sum(1 for r in rows if r["error"]),
+            "prompt_match_rate": round(sum(r["prompt_match"] for r in rows) / len(rows), 3),
+            "unmatched_upstream_requests": misses,
+        }
+        for key in ("ttft_ms", "total_ms"):
+            for q in (50, 95):
+                summary[f"recorded_{key}_p{q}"] = pct(f"recorded_{key}", q)
+                summary[f"replay_{key}_p{q}"] = pct(key, q)
+        return summary
@@ -0,0 +1,154 @@
+import http.client
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+
+from django.core.management.base import BaseCommand
+
+from src.testing.fake_upstream import FakeUpstream, fixed_responder
+
+
+def _serve(env, port_queue):
+    """Worker process: one single-threaded WSGI server, like a sync gunicorn worker."""
+    os.environ.update(env)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Voice_Assistant.settings")
+
+    import django
+    django.setup()
+
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = make_server("127.0.0.1", 0, get_wsgi_application(), handler_class=QuietHandler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def _ask(port, text, cookie):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    if cookie:
+        headers["Cookie"] = cookie
+    conn.request("POST", "/ask/", body=json.dumps({"text": text, "domain": "normal"}), headers=headers)
+    response = conn.getresponse()
+    body = response.read().decode("utf8")
+    conn.close()
+
+    for header in response.headers.get_all("Set-Cookie") or []:
+        morsel = SimpleCookie(header).get("sessionid")
+        if morsel:
+            cookie = f"sessionid={morsel.value}"
+    return response.status == 200 and '"done": true' in body, cookie
+
+
+class Command(BaseCommand):
+    help = (
+        "Start N worker processes sharing one cache backend and drive them with "
+        "round-robin (non-sticky) multi-turn sessions, reporting throughput per worker count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts (default 1,2,4)")
+        parser.add_argument("--sessions", type=int, default=8, help="Concurrent user sessions")
+        parser.add_argument("--turns", type=int, default=4, help="Turns per session")
+        parser.add_argument("--upstream-ms", type=int, default=200, help="Fake upstream time per reply")
+        parser.add_argument("--cache-url",
+                            help="Shared cache for the workers (default: a temporary file:// cache)")
+
+    def handle(self, *args, **options):
+        worker_counts = [int(n) for n in options["workers"].split(",")]
+        upstream = FakeUpstream(fixed_responder("Sure, that is fine.", ttft_ms=options["upstream_ms"])).start()
+        results = []
+
+        try:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                env = {
+                    "VOICE_CACHE_URL": options["cache_url"] or f"file://{cache_dir}",
+                    "AZURE_OPENAI_ENDPOINT": upstream.url,
+                    "AZURE_OPENAI_KEY": "fake-key",
+                    "AZURE_OPENAI_API_VERSION": os.getenv("AZURE_OPENAI_API_VERSION") or "2024-02-01",
+                    "AZURE_OPENAI_DEPLOYMENT_NAME": "fake-deployment",
+                }
+                for n in worker_counts:
+                    results.append(self.run(n, env, upstream, options["sessions"], options["turns"]))
+        finally:
+            upstream.stop()
+
+        base = results[0]["turns_per_s"] / results[0]["workers"]
+        for row in results:
+            row["efficiency"] = round(row["turns_per_s"] / (base * row["workers"]), 2)
+            self.stdout.write(json.dumps(row))
+
+    def run(self, n_workers, env, upstream, n_sessions, n_turns):
+        ctx = multiprocessing.get_context("spawn")
+        port_queue = ctx.Queue()
+        procs = [ctx.Process(target=_serve, args=(env, port_queue), daemon=True) for _ in range(n_workers)]
+        for proc in procs:
+            proc.start()
+
+        try:
+            ports = [port_queue.get(timeout=60) for _ in procs]
+            upstream.requests.clear()
+            errors = []
+            counter = iter(range(10 ** 9))
+            lock = threading.Lock()
+
+            def session(sid):
+                cookie = None
+                for turn in range(n_turns):
+                    with lock:
+                        port = ports[next(counter) % len(ports)]
+                    ok, cookie = _ask(port, f"session {sid} turn {turn}", cookie)
+                    if not ok:
+                        errors.append((sid, turn))
+
+            # Warm every worker (imports, client pools) before timing
+            for port in ports:
+                _ask(port, "warmup", None)
+            upstream.requests.clear()
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=session, args=(sid,)) for sid in range(n_sessions)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            for proc in procs:
+                proc.terminate()
+                proc.join()
+
+        total = n_sessions * n_turns
+        return {
+            "workers": n_workers,
+            "turns": total,
+            "errors": len(errors),
+            "seconds": round(elapsed, 3),
+            "turns_per_s": round(total / elapsed, 2),
+            "history_continuity": round(self.history_continuity(upstream.requests), 3),
+        }
+
+    @staticmethod
+    def history_continuity(requests):
+        """Fraction of turns whose prompt carried every earlier turn of the same session."""
+        ok = 0
+        for body in requests:
+            messages = body["messages"]
+            match = re.fullmatch(r"session (\d+) turn (\d+)", messages[-1]["content"])
+            if not match:
+                continue
+            turn = int(match.group(2))
+            # api_ask keeps at most the last 6 history messages, including this one
+            expected = min(2 * turn + 1, 6)
+            ok += len(messages) - 1 == expected
+        return ok / len(requests) if requests else 0.0
@@ -0,0 +1,25 @@
+import re
+import uuid
+
+from src.config.logging_setup import request_id_var
+
+# Incoming IDs end up in every log record, trace and response header
+_VALID_REQUEST_ID = re.compile(r"[\w.-]{1,64}", re.ASCII)
+
+
+class RequestIDMiddleware:
+    """Tag each request with an ID (honouring an incoming X-Request-ID) for log correlation."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get("X-Request-ID", "")
+        request.request_id = incoming if _VALID_REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex[:12]
+        token = request_id_var.set(request.request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response["X-Request-ID"] = request.request_id
+        return response
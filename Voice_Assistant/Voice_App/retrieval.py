@@ -0,0 +1,72 @@
+import logging
+import re
+
+from django.conf import settings
+
+from src.retrieval.embeddings import META_FILE, EmbeddingStore, StoreMismatchError, load_embedder
+
+logger = logging.getLogger("voice_app")
+
+# Loaded once per process and reloaded when build_embeddings replaces the files
+_store = None
+_store_version = None
+_embedder = None
+
+
+def get_store():
+    """Return the memory-mapped KB store, or None if it hasn't been built."""
+    global _store, _store_version
+    meta_path = settings.VOICE_EMBEDDINGS_DIR / META_FILE
+    try:
+        version = meta_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if version != _store_version:
+        try:
+            _store = EmbeddingStore.load(settings.VOICE_EMBEDDINGS_DIR)
+        except StoreMismatchError as e:
+            # Caught between the two file swaps; keep the old store and retry next call
+            logger.warning("Embeddings store not loaded: %s", e)
+            return _store
+        _store_version = version
+    return _store
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = load_embedder(settings.VOICE_EMBEDDER)
+    return _embedder
+
+
+def search_kb(domain, question, k=3):
+    """Top-k (score, chunk) matches for `question` in `domain`; empty if no store."""
+    store = get_store()
+    if store is None:
+        return []
+    try:
+        return store.query(get_embedder(), question, k=k, domain=domain)
+    except ValueError as e:
+        logger.warning("Embeddings store unusable: %s", e)
+        return []
+
+
+def retrieved_context(domain, question, k=3):
+    """KB excerpts most relevant to `question`, or None to fall back to the full KB."""
+    hits = search_kb(domain, question, k)
+    if not hits:
+        return None
+    return "\n\n".join(f"## {chunk['title']}\n{chunk['text']}" for _, chunk in hits)
+
+
+def kb_template_answer(domain, question, min_score=0.2, max_chars=220):
+    """A short spoken answer built straight from the best KB match, without the LLM."""
+    hits = search_kb(domain, question, k=1)
+    if not hits or hits[0][0] < min_score:
+        return None
+    chunk = hits[0][1]
+    text = re.sub(r"\s+", " ", chunk["text"]).strip()
+    if len(text) > max_chars:
+        cut = text.rfind(". ", 0, max_chars)
+        text = text[:cut + 1] if cut > 0 else text[:max_chars].rsplit(" ", 1)[0] + "."
+    return f"Here's what I have on {chunk['title']}: {text}"
@@ -1,3 +1,544 @@
-from django.test import TestCase
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import wave
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from src.audio import vad_eval
+from src.audio.vad import EnergyVAD, SAMPLE_RATE
+from src.config.logging_setup import DebugSampleFilter, JsonFormatter, request_id_var
+from src.retrieval.embeddings import EmbeddingStore, HashingEmbedder, StoreMismatchError
+from src.speech.speakable import SpeakableSegmenter, normalize_for_speech
+from src.testing.fake_upstream import FakeResponse, FakeUpstream, fixed_responder, sequence_responder
+from src.tracing.recorder import get_recorder, load_traces
+from Voice_App import retrieval, views
+from Voice_App.degradation import (
+    APOLOGY_TEXT, FILLER_TEXT, CircuitBreaker, fallback_answer, get_guard, remember_answer, reset_guard,
+)
+
+
+def _tone(seconds, amp=0.2, freq=200):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return amp * np.sin(2 * np.pi * freq * t)
+
+
+def _noise(seconds, amp=0.003, seed=0):
+    return amp * np.random.default_rng(seed).standard_normal(int(seconds * SAMPLE_RATE))
+
+
+def _pcm(*parts):
+    return (np.clip(np.concatenate(parts), -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+class EnergyVADTests(SimpleTestCase):
+    def test_detects_start_and_end_of_speech(self):
+        vad = EnergyVAD(hangover_ms=300, adaptive=False)
+        events = vad.process(_pcm(_noise(0.5), _tone(1.0) + _noise(1.0, seed=1), _noise(1.0, seed=2)))
+
+        kinds = [kind for kind, _ in events]
+        self.assertEqual(kinds, ["start", "end"])
+        self.assertAlmostEqual(events[0][1], 0.5, delta=0.05)
+        self.assertAlmostEqual(events[1][1], 1.8, delta=0.05)
+
+    def test_noise_alone_is_not_speech(self):
+        vad = EnergyVAD()
+        self.assertEqual(vad.process(_pcm(_noise(2.0))), [])
+
+    def test_hangover_adapts_to_short_pauses(self):
+        vad = EnergyVAD(hangover_ms=700)
+        parts = [_noise(0.5)]
+        for i in range(4):
+            parts += [_tone(0.4), _noise(0.2, seed=i + 1)]
+        vad.process(_pcm(*parts))
+
+        self.assertLess(vad.hangover_frames * 20, 700)
+
+
+class VADEvalTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        # One turn spoken straight through, one with a 0.4 s pause mid-utterance
+        self._fixture("steady", 1.5, _noise(0.5), _tone(1.0), _noise(1.5, seed=1))
+        self._fixture("pause", 2.1, _noise(0.5), _tone(0.6), _noise(0.4, seed=2), _tone(0.6), _noise(1.5, seed=3))
+        self._fixture("unlabelled", None, _noise(0.5))
+
+    def _fixture(self, name, speech_end, *parts):
+        with wave.open(os.path.join(self.dir, f"{name}.wav"), "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(SAMPLE_RATE)
+            wf.writeframes(_pcm(*parts))
+        if speech_end is not None:
+            Path(self.dir, f"{name}.json").write_text(json.dumps({"speech_end": speech_end}), encoding="utf8")
+
+    def _run(self, *args):
+        out = StringIO()
+        with contextlib.redirect_stdout(out):
+            vad_eval.main([self.dir, "--verbose", *args])
+        lines = out.getvalue().splitlines()
+        rows = [json.loads(line) for line in lines if line.startswith("{\"")]
+        return rows, json.loads("\n".join(lines[len(rows):]))
+
+    def test_reports_endpoint_latency(self):
+        rows, summary = self._run("--fixed-hangover-ms", "700")
+
+        self.assertEqual([r["file"] for r in rows], ["pause.wav", "steady.wav"])
+        for row in rows:
+            self.assertFalse(row["cut_off"])
+            self.assertAlmostEqual(row["latency_ms"], 700, delta=120)
+        self.assertEqual(summary["files"], 2)
+        self.assertEqual(summary["false_cutoff_rate"], 0.0)
+
+    def test_short_hangover_cuts_off_a_pausing_speaker(self):
+        rows, summary = self._run("--fixed-hangover-ms", "200")
+        pause, steady = rows
+
+        self.assertTrue(pause["cut_off"])
+        self.assertLess(pause["latency_ms"], -500)
+        self.assertFalse(steady["cut_off"])
+        self.assertAlmostEqual(steady["latency_ms"], 200, delta=60)
+        self.assertEqual(summary["false_cutoff_rate"], 0.5)
+        # Latency stats cover only turns that weren't cut off
+        self.assertEqual(summary["latency_ms_mean"], steady["latency_ms"])
+
+
+class LoggingSetupTests(SimpleTestCase):
+    def _record(self, level=logging.INFO, msg="hello %s", args=("world",), **extra):
+        record = logging.LogRecord("voice_app", level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra_fields(self):
+        entry = json.loads(JsonFormatter().format(self._record(request_id="abc", ttft_ms=42)))
+
+        self.assertEqual(entry["msg"], "hello world")
+        self.assertEqual(entry["request_id"], "abc")
+        self.assertEqual(entry["ttft_ms"], 42)
+
+    def test_debug_records_are_sampled_per_template(self):
+        sampler = DebugSampleFilter(rate=5)
+        kept = [sampler.filter(self._record(logging.DEBUG, "chunk", ())) for _ in range(20)]
+        infos = [sampler.filter(self._record()) for _ in range(3)]
+
+        self.assertEqual(sum(kept), 4)
+        self.assertTrue(all(infos))
+
+
+class RequestIDMiddlewareTests(TestCase):
+    def test_request_id_comes_from_the_middleware(self):
+        response = self.client.post("/reset/", HTTP_X_REQUEST_ID="req-123")
+
+        self.assertEqual(response["X-Request-ID"], "req-123")
+        self.assertEqual(request_id_var.get(), "-")
+
+    def test_malformed_request_id_is_replaced(self):
+        for bad in ["x" * 65, "a b", "id\u00e9", "<script>"]:
+            response = self.client.post("/reset/", HTTP_X_REQUEST_ID=bad)
+            self.assertRegex(response["X-Request-ID"], r"^[0-9a-f]{12}$")
+
+
+def _segment(tokens, **kwargs):
+    segmenter = SpeakableSegmenter(**kwargs)
+    emitted = [(i, unit) for i, token in enumerate(tokens) for unit in segmenter.feed(token)]
+    return emitted, segmenter.flush()
+
+
+class SpeakableSegmenterTests(SimpleTestCase):
+    def test_units_are_emitted_as_soon_as_each_clause_completes(self):
+        tokens = ["Dr", ".", " Sharma", " sits", " in", " room", " 12", ".", " Visit", " at", " 10", ":", "30", " AM", "."]
+        emitted, rest = _segment(tokens)
+
+        self.assertEqual(emitted, [(8, "Dr. Sharma sits in room twelve.")])
+        self.assertEqual(rest, ["Visit at ten thirty A M."])
+
+    def test_markdown_and_symbols_are_stripped(self):
+        tokens = ["**Fees", ":**", " ₹1,", "500", " (", "10", "%", " off", ")", "\n", "- ", "Open", " 24", "/7"]
+        emitted, rest = _segment(tokens)
+
+        self.assertEqual([unit for _, unit in emitted] + rest, [
+            "Fees:",
+            "one thousand five hundred rupees (ten percent off)",
+            "Open twenty four seven",
+        ])
+
+    def test_long_clauses_are_cut_at_a_space(self):
+        emitted, rest = _segment(["word "] * 30, max_chars=40)
+
+        self.assertTrue(all(len(unit) <= 40 for _, unit in emitted))
+        self.assertEqual(" ".join([unit for _, unit in emitted] + rest), " ".join(["word"] * 30))
+
+    def test_normalize_numbers(self):
+        self.assertEqual(normalize_for_speech("The 3rd visit costs $2.5"), "The third visit costs two point five dollars")
+        self.assertEqual(normalize_for_speech("Call 9876543210"), "Call nine eight seven six five four three two one zero")
+
+    def test_phone_numbers_and_dates_are_not_read_as_ranges(self):
+        self.assertEqual(normalize_for_speech("Call 0612-2231234"),
+                         "Call zero six one two, two two three one two three four")
+        self.assertEqual(normalize_for_speech("Call 98765-43210"),
+                         "Call nine eight seven six five, four three two one zero")
+        self.assertEqual(normalize_for_speech("Booked for 2024-01-15"), "Booked for fifteenth January two thousand twenty four")
+        self.assertEqual(normalize_for_speech("OPD 9-5, fees 1000-2000"), "OPD nine to five, fees one thousand to two thousand")
+        self.assertEqual(normalize_for_speech("Open 0-5 years"), "Open zero to five years")
+        self.assertEqual(normalize_for_speech("Rooms 101 102 103"),
+                         "Rooms one hundred one one hundred two one hundred three")
+        self.assertEqual(normalize_for_speech("Visit 2 - 3 pm"), "Visit two to three P M")
+
+    def test_commas_only_group_thousands(self):
+        self.assertEqual(normalize_for_speech("Room 1,2"), "Room one,two")
+        self.assertEqual(normalize_for_speech("12,345 patients"), "twelve thousand three hundred forty five patients")
+        self.assertEqual(normalize_for_speech("₹1,00,000"), "one hundred thousand rupees")
+
+
+def _clear_caches():
+    # Successful turns are remembered as fallback answers; start every test without them
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+def _ask(client, text, domain="normal"):
+    response = client.post("/ask/", data=json.dumps({"text": text, "domain": domain}),
+                           content_type="application/json")
+    return [json.loads(line[6:]) for line in b"".join(response.streaming_content).decode().splitlines()
+            if line.startswith("data: ")]
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cache")
+class TraceReplayTests(TestCase):
+    def setUp(self):
+        _clear_caches()
+
+    def test_recorded_turn_replays_with_same_prompt_and_output(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        trace_dir = tmp.name
+        with FakeUpstream(fixed_responder("It opens at nine.", ttft_ms=50, chunk_ms=10)) as upstream, \
+                upstream.environ(), mock.patch.dict(os.environ, {"VOICE_TRACE_DIR": trace_dir}):
+            events = _ask(self.client, "When does it open?")
+            get_recorder().close()
+
+        self.assertTrue(events[-1]["done"])
+        trace_path = os.path.join(trace_dir, "traces-api_ask.jsonl")
+        [trace] = load_traces([trace_path])
+        self.assertEqual(trace["output"], "It opens at nine.")
+        self.assertEqual(len(trace["chunks"]), 4)
+        self.assertGreaterEqual(trace["ttft_ms"], 50)
+
+        self.assertEqual([e["speak"] for e in events if "speak" in e], ["It opens at nine."])
+
+        out_path = os.path.join(trace_dir, "replay.jsonl")
+        _clear_caches()
+        call_command("replay_traces", trace_path, "--output", out_path, "--no-warmup", stdout=StringIO())
+        self.assertNotEqual(fallback_answer("normal", "When does it open?")[0], "cache")
+        [row] = load_traces([out_path])
+        self.assertTrue(row["prompt_match"])
+        self.assertTrue(row["output_match"])
+        self.assertGreaterEqual(row["ttft_ms"], 50)
+
+
+class SharedStateTests(TestCase):
+    def setUp(self):
+        _clear_caches()
+
+    def test_history_survives_between_turns(self):
+        with FakeUpstream(fixed_responder("Noted.")) as upstream, upstream.environ():
+            _ask(self.client, "first question")
+            _ask(self.client, "second question")
+
+        contents = [m["content"] for m in upstream.requests[-1]["messages"][1:]]
+        self.assertEqual(contents, ["first question", "Noted.", "second question"])
+
+    def test_workers_share_sessions(self):
+        # Throughput scaling is measured by `manage.py scale_bench`, not asserted here
+        out = StringIO()
+        call_command("scale_bench", "--workers", "2", "--sessions", "4", "--turns", "3",
+                     "--upstream-ms", "20", stdout=out)
+        [two] = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertEqual(two["errors"], 0)
+        self.assertEqual(two["history_continuity"], 1.0)
+
+    def test_kb_edit_replaces_the_cached_version(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        kb = Path(tmp.name, "healthcare.md")
+        kb.write_text("v1", encoding="utf8")
+        os.utime(kb, ns=(1, 1))
+
+        with mock.patch.dict(views.KB_FILES, {"healthcare": kb}), mock.patch.dict(views._kb_local, clear=True):
+            self.assertEqual(views.load_kb("healthcare"), "v1")
+            kb.write_text("v2", encoding="utf8")
+            os.utime(kb, ns=(2, 2))
+            self.assertEqual(views.load_kb("healthcare"), "v2")
+
+        self.assertIsNone(cache.get("kb:healthcare:1"))
+        self.assertEqual(cache.get("kb:healthcare:2"), "v2")
+
+
+class EmbeddingStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        kb_dir = os.path.join(self.dir, "kb")
+        os.makedirs(kb_dir)
+        with open(os.path.join(kb_dir, "healthcare.md"), "w", encoding="utf8") as f:
+            f.write("# Cardiology\nDr. Anil Gupta sees heart patients in Room 204.\n\n"
+                    "# Orthopedics\nDr. Meena Rao does knee replacements in Room 310.\n")
+        with open(os.path.join(kb_dir, "finance.md"), "w", encoding="utf8") as f:
+            f.write("# Loans\nHome loan interest starts at 8.5 percent.\n")
+        departments = os.path.join(self.dir, "departments.json")
+        with open(departments, "w", encoding="utf8") as f:
+            json.dump({
+                "Neurology": {
+                    "treatments": [{"english": "Stroke care", "hindi": "स्ट्रोक देखभाल"}, {"english": "", "hindi": ""}],
+                    "doctors": [{"name": "Dr. S. Kumar", "qualification": "DM"}],
+                },
+                "Dermatology": {
+                    "treatments": [{"english": "No treatment information available", "hindi": ""}],
+                    "doctors": [],
+                },
+            }, f, ensure_ascii=False)
+
+        self.out = os.path.join(self.dir, "embeddings")
+        call_command("build_embeddings", "--kb-dir", kb_dir, "--departments", departments,
+                     "--out", self.out, stdout=StringIO())
+
+    def test_build_writes_memory_mapped_float16_matrix(self):
+        store = EmbeddingStore.load(self.out)
+
+        self.assertIsInstance(store.vectors, np.memmap)
+        self.assertEqual(store.vectors.dtype, np.float16)
+        self.assertEqual(store.vectors.shape, (5, HashingEmbedder().dim))
+        self.assertEqual({c["source"] for c in store.chunks}, {"healthcare.md", "finance.md", "departments.json"})
+        departments = {c["title"]: c["text"] for c in store.chunks if c["source"] == "departments.json"}
+        self.assertEqual(departments, {
+            "Neurology": "Department: Neurology. Doctors: Dr. S. Kumar (DM). Treatments: Stroke care.",
+            "Dermatology": "Department: Dermatology.",
+        })
+
+    def test_query_ranks_matching_chunk_first_within_domain(self):
+        store = EmbeddingStore.load(self.out)
+        embedder = HashingEmbedder()
+
+        self.assertEqual(store.query(embedder, "knee replacement")[0][1]["title"], "Orthopedics")
+        self.assertEqual(store.query(embedder, "stroke care")[0][1]["title"], "Neurology")
+        hits = store.query(embedder, "home loan", domain="healthcare")
+        self.assertTrue(all(chunk["domain"] == "healthcare" for _, chunk in hits))
+
+    def test_query_rejects_a_different_embedder(self):
+        store = EmbeddingStore.load(self.out)
+        with self.assertRaises(ValueError):
+            store.query(HashingEmbedder(dim=64), "knee")
+
+    def test_load_rejects_vectors_and_metadata_from_different_builds(self):
+        other = os.path.join(self.dir, "other")
+        EmbeddingStore.build([{"domain": "healthcare", "source": "x.md", "title": "X", "text": "x"}],
+                             HashingEmbedder(), other)
+        os.replace(os.path.join(other, "vectors.npy"), os.path.join(self.out, "vectors.npy"))
+
+        with self.assertRaises(StoreMismatchError):
+            EmbeddingStore.load(self.out)
+        with override_settings(VOICE_EMBEDDINGS_DIR=Path(self.out)), \
+                mock.patch.multiple(retrieval, _store=None, _store_version=None):
+            self.assertIsNone(retrieval.get_store())
+
+
+FAST_SLO = {
+    "FILLER_AFTER_S": 0.15,
+    "FIRST_TOKEN_DEADLINE_S": 0.5,
+    "STALL_S": 0.5,
+    "P95_TARGET_S": 0.3,
+    "BREAKER_FAILURES": 2,
+    "BREAKER_RESET_S": 60,
+    "ANSWER_CACHE_TTL_S": 60,
+}
+
+
+@override_settings(VOICE_SLO=FAST_SLO)
+class DegradationTests(TestCase):
+    def setUp(self):
+        _clear_caches()
+        reset_guard()
+        self.addCleanup(reset_guard)
+
+    def test_slow_first_token_sends_a_filler_then_the_answer(self):
+        with FakeUpstream(fixed_responder("Room 12.", ttft_ms=300)) as upstream, upstream.environ():
+            events = _ask(self.client, "Where is cardiology?")
+
+        self.assertEqual(events[0], {"speak": FILLER_TEXT})
+        self.assertIn({"chunk": "Room"}, events)
+        self.assertEqual(events[-1], {"done": True})
+
+    def test_upstream_timeout_falls_back_to_cached_answer(self):
+        remember_answer("normal", "what are the opd hours", "Ten to two.")
+        with FakeUpstream(fixed_responder("Too late.", ttft_ms=1500)) as upstream, upstream.environ():
+            events = _ask(self.client, "What are the OPD   hours")
+
+        self.assertIn({"chunk": "Ten to two."}, events)
+        self.assertEqual(events[-1], {"done": True, "degraded": "cache"})
+
+    def test_dropped_stream_keeps_partial_answer(self):
+        responder = fixed_responder("It is open today.", chunk_ms=10)
+        dropped = FakeResponse(responder({}).chunks, drop_after=2)
+        with FakeUpstream(lambda body: dropped) as upstream, upstream.environ():
+            events = _ask(self.client, "Is it open?")
+
+        self.assertEqual("".join(e.get("chunk", "") for e in events), "It is")
+        self.assertEqual(events[-1], {"done": True, "degraded": "partial"})
+
+    def test_breaker_opens_after_repeated_failures(self):
+        with FakeUpstream(lambda body: FakeResponse([], status=500)) as upstream, upstream.environ():
+            for _ in range(3):
+                events = _ask(self.client, "Hello?")
+
+        self.assertEqual(len(upstream.requests), 2)
+        self.assertEqual(get_guard().breaker.state, "open")
+        self.assertIn({"chunk": APOLOGY_TEXT}, events)
+
+        # The apology the user heard is kept as the assistant turn
+        self.assertEqual([(m["role"], m["content"]) for m in upstream.requests[1]["messages"][1:]],
+                         [("user", "Hello?"), ("assistant", APOLOGY_TEXT), ("user", "Hello?")])
+
+    @override_settings(VOICE_SLO=dict(FAST_SLO, BREAKER_RESET_S=0))
+    def test_disconnected_trial_request_still_settles_breaker(self):
+        guard = get_guard()
+        guard.breaker.record_failure()
+        guard.breaker.record_failure()
+
+        before = set(threading.enumerate())
+        slow = FakeResponse([(5000, "Too slow.")])
+        with FakeUpstream(lambda body: slow) as upstream, upstream.environ():
+            response = self.client.post("/ask/", data=json.dumps({"text": "Hello?"}),
+                                        content_type="application/json")
+            stream = iter(response.streaming_content)
+            self.assertIn(FILLER_TEXT, next(stream).decode())
+            response.close()
+
+            self.assertEqual(guard.breaker.state, "open")
+            # Closing the response also stops the watchdog's reader thread
+            for thread in set(threading.enumerate()) - before:
+                if thread.name == "StreamWatchdog":
+                    thread.join(timeout=1)
+                    self.assertFalse(thread.is_alive())
+
+        with FakeUpstream(fixed_responder("Back again.")) as upstream, upstream.environ():
+            events = _ask(self.client, "Hello?")
+
+        self.assertIn({"chunk": "Back"}, events)
+        self.assertEqual(guard.breaker.state, "closed")
+
+    def test_unreported_half_open_trial_expires(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_after_s=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, "half_open")
+
+    def test_high_p95_shrinks_max_tokens_and_history(self):
+        responder = sequence_responder([FakeResponse([(0, "One.")])] * 2 + [FakeResponse([(0, "Two.")])])
+        with FakeUpstream(responder) as upstream, upstream.environ():
+            _ask(self.client, "first")
+            for _ in range(5):
+                get_guard().latency.add(1.0)
+            _ask(self.client, "second")
+
+        normal, shrunk = upstream.requests
+        self.assertEqual(normal["max_tokens"], 80)
+        self.assertEqual(shrunk["max_tokens"], 32)
+        self.assertEqual([m["content"] for m in shrunk["messages"][1:]], ["second"])
+
+    def test_kb_template_answer_from_embeddings(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        out = tmp.name
+        chunks = [{"domain": "healthcare", "source": "healthcare.md", "title": "Cardiology",
+                   "text": "Dr. Anil Gupta sees heart patients in Room 204 from 10 AM."}]
+        EmbeddingStore.build(chunks, HashingEmbedder(), out)
+
+        with override_settings(VOICE_EMBEDDINGS_DIR=Path(out)):
+            source, text = fallback_answer("healthcare", "which room for heart patients cardiology")
+
+        self.assertEqual(source, "kb")
+        self.assertIn("Room 204", text)
+
+
+@override_settings(VOICE_SLO=FAST_SLO)
+class BatchAskTests(TestCase):
+    def setUp(self):
+        _clear_caches()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.work = tmp.name
+
+    def _questions(self, *rows):
+        path = os.path.join(self.work, "questions.jsonl")
+        with open(path, "w", encoding="utf8") as f:
+            for domain, question in rows:
+                f.write(json.dumps({"domain": domain, "question": question}) + "\n")
+        return path
+
+    def test_batch_answers_write_stats_and_warm_cache(self):
+        questions = self._questions(("normal", "Where is the canteen?"), ("normal", "Hello there"))
+        out_path = os.path.join(self.work, "results.jsonl")
+        with FakeUpstream(fixed_responder("Ground floor, near gate two.", ttft_ms=30)) as upstream, \
+                upstream.environ():
+            call_command("batch_ask", questions, "--output", out_path, "--concurrency", "2",
+                         "--include-usage", "--warm-cache", stdout=StringIO())
+
+        rows = load_traces([out_path])
+        self.assertEqual([r["error"] for r in rows], [None, None])
+        self.assertEqual(rows[0]["answer"], "Ground floor, near gate two.")
+        self.assertEqual(rows[0]["usage_source"], "upstream")
+        self.assertGreaterEqual(rows[0]["ttft_ms"], 30)
+        self.assertTrue(all(r["stream_options"] == {"include_usage": True} for r in upstream.requests))
+        self.assertEqual(fallback_answer("normal", "where is the CANTEEN?"), ("cache", "Ground floor, near gate two."))
+
+    def test_kb_dir_prompts_use_that_kb_and_estimate_usage(self):
+        questions = self._questions(("healthcare", "Where is cardiology?"))
+        Path(self.work, "healthcare.md").write_text("# Cardiology\nRoom 204.", encoding="utf8")
+        out_path = os.path.join(self.work, "results.jsonl")
+        with FakeUpstream(fixed_responder("Room 204.")) as upstream, upstream.environ():
+            call_command("batch_ask", questions, "--output", out_path, "--kb-dir", self.work, stdout=StringIO())
+
+        [request] = upstream.requests
+        self.assertIn("--- KB START ---\n# Cardiology\nRoom 204.", request["messages"][0]["content"])
+        self.assertNotIn("stream_options", request)
+        [row] = load_traces([out_path])
+        self.assertEqual(row["usage_source"], "estimate")
+
+    def test_fake_upstream_flag_runs_without_azure(self):
+        questions = os.path.join(self.work, "healthcare.txt")
+        Path(questions).write_text("Where is cardiology?\nOPD hours?\n", encoding="utf8")
+        Path(self.work, "healthcare.md").write_text("# OPD\nTen to two.", encoding="utf8")
+
+        out = StringIO()
+        call_command("batch_ask", questions, "--output", os.path.join(self.work, "out.jsonl"),
+                     "--kb-dir", self.work, "--fake-upstream", "--fake-ttft-ms", "10", stdout=out)
+        summary = json.loads(out.getvalue())
+
+        self.assertEqual(summary["healthcare"]["questions"], 2)
+        self.assertEqual(summary["healthcare"]["errors"], 0)
+
+    def test_warm_cache_refuses_fake_answers_and_other_kb_versions(self):
+        questions = self._questions(("normal", "Hello there"))
+        for flags in (["--fake-upstream"], ["--kb-dir", self.work]):
+            with self.assertRaisesMessage(CommandError, "--warm-cache cannot be combined"):
+                call_command("batch_ask", questions, "--output", os.path.join(self.work, "out.jsonl"),
+                             "--warm-cache", *flags, stdout=StringIO())
@@ -1,13 +1,22 @@
 import json
 import logging
+import time
 import httpx
 from django.shortcuts import render
 from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from openai import AzureOpenAI
+from django.conf import settings
 from django.core.cache import cache
 from src.config.config import MyConfig
+from Voice_App.degradation import (
+    FILLER_TEXT, StreamWatchdog, fallback_answer, get_guard, remember_answer, slo,
+)
+from Voice_App.retrieval import retrieved_context
+from src.config.logging_setup import request_id_var
 from src.prompts.system_prompt import VOICE_ASSISTANT_PROMPT
+from src.speech.speakable import SpeakableSegmenter
+from src.tracing.recorder import get_recorder
 from pathlib import Path
 
 logger = logging.getLogger("voice_app")
@@ -20,17 +29,24 @@ KB_FILES = {
     "finance": KB_DIR / "finance.md",
 }
 
-# Cache the Azure client globally
+# Cache the Azure client globally (rebuilt if the configured endpoint changes).
+# It only holds a connection pool, so each worker keeping its own is fine; all
+# per-user and per-domain state lives in the shared cache / session backend.
 _azure_client = None
+_azure_endpoint = None
 
 def get_azure_client():
-    global _azure_client
-    if _azure_client is None:
-        config = MyConfig.envFile()
+    global _azure_client, _azure_endpoint
+    config = MyConfig.envFile()
+    if _azure_client is None or _azure_endpoint != config["AZURE_OPENAI_ENDPOINT"]:
+        _azure_endpoint = config["AZURE_OPENAI_ENDPOINT"]
         _azure_client = AzureOpenAI(
             api_key=config["AZURE_OPENAI_KEY"],
             api_version=config["AZURE_OPENAI_API_VERSION"],
             azure_endpoint=config["AZURE_OPENAI_ENDPOINT"],
+            # No SDK retries: a slow or failing upstream is handled by the
+            # degradation path (filler, fallbacks, circuit breaker) instead
+            max_retries=0,
             http_client=httpx.Client(
                 timeout=10,
                 limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
@@ -43,16 +59,61 @@ def index(request):
     return render(request, "voice_app/index.html")
 
 
+# Per-process copy of KB text, keyed by file version, in front of the shared cache
+# so workers don't fetch the whole KB from the cache server on every request.
+_kb_local = {}
+
+
 def load_kb(domain):
-    kb = cache.get(domain)
-    if kb:
-        return kb
     fp = KB_FILES.get(domain)
-    content = fp.read_text("utf8")
-    cache.set(domain, content, timeout=None)
+    version = fp.stat().st_mtime_ns
+    local = _kb_local.get(domain)
+    if local and local[0] == version:
+        return local[1]
+
+    if local:
+        # The file changed; drop the copy of the version this worker last used
+        cache.delete(f"kb:{domain}:{local[0]}")
+
+    key = f"kb:{domain}:{version}"
+    content = cache.get(key)
+    if content is None:
+        content = fp.read_text("utf8")
+        cache.set(key, content, timeout=settings.VOICE_KB_CACHE_TTL_S)
+    _kb_local[domain] = (version, content)
     return content
 
 
+# Enhanced system prompt for direct, concise answers
+BASE_PERSONALITY = """You are a helpful AI voice assistant. 
+- Give DIRECT, SHORT answers to what the user asks
+- Answer in 1-2 sentences maximum for voice interaction
+- Match the user's language - if they speak Hinglish, reply in Hinglish
+- NO greetings, NO extra explanations unless asked
+- Be natural and conversational but BRIEF
+- Just answer the question directly"""
+
+
+def build_messages(domain, history, kb_text=None):
+    """System prompt plus chat history for `domain`. `kb_text` overrides the full KB file."""
+    if domain == "normal":
+        system_prompt = BASE_PERSONALITY
+    else:
+        kb_text = kb_text or load_kb(domain)
+        system_prompt = (
+            f"{BASE_PERSONALITY}\n\n"
+            f"Answer ONLY using the {domain} knowledge base below.\n"
+            f"Give direct answers with specific information (doctor names, room numbers, timings).\n"
+            f"If information is missing, say: 'Sorry, I don't have that information.'\n\n"
+            f"--- KB START ---\n{kb_text}\n--- KB END ---"
+        )
+    return [{"role": "system", "content": system_prompt}] + history
+
+
+def _sse(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
 @csrf_exempt
 def api_ask(request):
     if request.method != "POST":
@@ -78,65 +139,135 @@ def api_ask(request):
         if len(history) > 6:
             history = history[-6:]
 
-        # Enhanced system prompt for direct, concise answers
-        base_personality = """You are a helpful AI voice assistant. 
-- Give DIRECT, SHORT answers to what the user asks
-- Answer in 1-2 sentences maximum for voice interaction
-- Match the user's language - if they speak Hinglish, reply in Hinglish
-- NO greetings, NO extra explanations unless asked
-- Be natural and conversational but BRIEF
-- Just answer the question directly"""
-
-        # Prepare system prompt
-        if selected_domain == "normal":
-            system_prompt = base_personality
-        else:
-            kb_text = load_kb(selected_domain)
-            system_prompt = (
-                f"{base_personality}\n\n"
-                f"Answer ONLY using the {selected_domain} knowledge base below.\n"
-                f"Give direct answers with specific information (doctor names, room numbers, timings).\n"
-                f"If information is missing, say: 'Sorry, I don't have that information.'\n\n"
-                f"--- KB START ---\n{kb_text}\n--- KB END ---"
-            )
+        # When upstream is slow, send less: fewer history turns, and only the
+        # KB excerpts relevant to the question instead of the whole file
+        guard = get_guard()
+        budget = guard.budget()
+        kb_text = None
+        if budget["retrieval"] and selected_domain != "normal":
+            kb_text = retrieved_context(selected_domain, user_text)
+        messages = build_messages(selected_domain, history[-budget["history"]:], kb_text)
+        request_id = getattr(request, "request_id", "-")
 
-        messages = [{"role": "system", "content": system_prompt}] + history
+        # Store the user turn now; the session middleware saves (and sets the cookie)
+        # before the stream below runs, so the reply is saved explicitly at the end.
+        request.session["chat_history"] = history
 
         # Stream generator
         def generate_stream():
-            client = get_azure_client()
+            # The body runs after the middleware has returned, so restore the request ID here
+            token = request_id_var.set(request_id)
+            try:
+                yield from stream_events()
+            finally:
+                request_id_var.reset(token)
+
+        def stream_events():
             full_response = ""
-            
+            started = time.perf_counter()
+            first_chunk_at = None
+            n_chunks = 0
+            failure = None
+            degraded = None
+            params = {
+                "max_tokens": budget["max_tokens"],  # 80 normally; less while upstream is slow
+                "temperature": 0.7,  # Balanced for natural but focused responses
+            }
+            recorder = get_recorder()
+            trace = recorder.start("api_ask", messages, selected_domain, params) if recorder else None
+            # Complete clauses are sent as 'speak' events so the client can start TTS early
+            segmenter = SpeakableSegmenter()
+
             try:
-                stream = client.chat.completions.create(
-                    model=MyConfig.envFile()["AZURE_OPENAI_DEPLOYMENT_NAME"],
-                    messages=messages,
-                    max_tokens=80,  # Reduced for shorter answers
-                    temperature=0.7,  # Balanced for natural but focused responses
-                    stream=True
-                )
-
-                for chunk in stream:
-                    if (hasattr(chunk, 'choices') and 
-                        len(chunk.choices) > 0 and 
-                        hasattr(chunk.choices[0], 'delta') and 
-                        hasattr(chunk.choices[0].delta, 'content') and
-                        chunk.choices[0].delta.content):
-                        
-                        content = chunk.choices[0].delta.content
-                        full_response += content
-                        yield f"data: {json.dumps({'chunk': content})}\n\n"
-
-                yield f"data: {json.dumps({'done': True})}\n\n"
-
-                if full_response:
-                    history.append({"role": "assistant", "content": full_response})
-                    request.session["chat_history"] = history
-                    request.session.modified = True
+                if guard.breaker.allow():
+                    watchdog = StreamWatchdog(lambda: get_azure_client().chat.completions.create(
+                        model=MyConfig.envFile()["AZURE_OPENAI_DEPLOYMENT_NAME"],
+                        messages=messages,
+                        stream=True,
+                        **params
+                    ))
+                    completed = False
+                    try:
+                        for kind, content in watchdog.events(
+                                slo("FILLER_AFTER_S"), slo("FIRST_TOKEN_DEADLINE_S"), slo("STALL_S")):
+                            if kind == "slow":
+                                logger.info("Slow first token, sending filler")
+                                yield _sse({'speak': FILLER_TEXT})
+                            elif kind == "chunk":
+                                if first_chunk_at is None:
+                                    first_chunk_at = time.perf_counter()
+                                n_chunks += 1
+                                logger.debug("Stream chunk", extra={"chunk_index": n_chunks, "chars": len(content)})
+                                full_response += content
+                                if trace:
+                                    trace.chunk(content)
+                                yield _sse({'chunk': content})
+                                for unit in segmenter.feed(content):
+                                    yield _sse({'speak': unit})
+                            elif kind == "error":
+                                logger.error("Upstream error: %s", content)
+                                failure = str(content) or type(content).__name__
+                            elif kind == "timeout":
+                                failure = "timeout"
+                        completed = True
+                    finally:
+                        # Runs on client disconnect (GeneratorExit at a yield) too: an allowed
+                        # call must always be recorded, or a half-open breaker never settles
+                        watchdog.cancel()
+                        if completed:
+                            guard.latency.add(time.perf_counter() - started)
+                        if failure or not completed:
+                            guard.breaker.record_failure()
+                        else:
+                            guard.breaker.record_success()
+                else:
+                    failure = "circuit_open"
+
+                fallback_text = ""
+                if failure and not full_response:
+                    # Never leave the voice user in silence: answer from what we have
+                    degraded, fallback_text = fallback_answer(selected_domain, user_text)
+                    yield _sse({'chunk': fallback_text})
+                    for unit in segmenter.feed(fallback_text):
+                        yield _sse({'speak': unit})
+                elif failure:
+                    degraded = "partial"
+
+                for unit in segmenter.flush():
+                    yield _sse({'speak': unit})
+                yield _sse({'done': True, 'degraded': degraded} if degraded else {'done': True})
+
+                finished = time.perf_counter()
+                logger.info("Stream complete", extra={
+                    "domain": selected_domain,
+                    "ttft_ms": round((first_chunk_at - started) * 1000) if first_chunk_at else None,
+                    "total_ms": round((finished - started) * 1000),
+                    "chunks": n_chunks,
+                    "response_chars": len(full_response),
+                    "budget": budget["level"],
+                    "failure": failure,
+                    "degraded": degraded,
+                })
+                if trace:
+                    trace.finish(full_response, error=failure)
+
+                if full_response and not failure:
+                    remember_answer(selected_domain, user_text, full_response)
+                # Whatever the user heard becomes the assistant turn, so history never
+                # ends on a dangling user message
+                reply = full_response or fallback_text
+                if reply:
+                    history.append({"role": "assistant", "content": reply})
+                else:
+                    history.pop()
+                request.session["chat_history"] = history
+                request.session.save()
 
             except Exception as e:
                 logger.exception("Error in stream generation")
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                if trace:
+                    trace.finish(full_response, error=str(e))
+                yield _sse({'error': str(e)})
 
         return StreamingHttpResponse(
             generate_stream(),
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'Voice_App.middleware.RequestIDMiddleware',
 ]
 
 ROOT_URLCONF = 'Voice_Assistant.urls'
@@ -83,6 +84,87 @@ DATABASES = {
 }
 
 
+# Shared state
+# VOICE_CACHE_URL picks where the KB cache and, when set, user sessions (selected
+# domain + chat history) are kept, so any worker on any node can serve any turn:
+#   unset               -> per-process memory (single worker, tests)
+#   redis://host:6379/0 -> Redis shared by every worker and node (needs `redis`)
+#   file:///shared/dir  -> files on a path shared by the workers of one host
+
+VOICE_CACHE_URL = os.getenv('VOICE_CACHE_URL', '')
+
+# Sessions get their own cache alias so culling the KB / answer cache never
+# drops a conversation; session entries expire with SESSION_COOKIE_AGE instead.
+SESSION_MAX_ENTRIES = 1_000_000
+
+if VOICE_CACHE_URL.startswith(('redis://', 'rediss://')):
+    # Redis evicts by its maxmemory-policy; use volatile-* so sessions (which
+    # always carry a TTL) go only after expired cache entries
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': VOICE_CACHE_URL,
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': VOICE_CACHE_URL,
+            'KEY_PREFIX': 'session',
+        },
+    }
+elif VOICE_CACHE_URL.startswith('file://'):
+    CACHE_DIR = Path(VOICE_CACHE_URL[len('file://'):])
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR / 'default',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR / 'sessions',
+            'OPTIONS': {'MAX_ENTRIES': SESSION_MAX_ENTRIES},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sessions',
+            'OPTIONS': {'MAX_ENTRIES': SESSION_MAX_ENTRIES},
+        },
+    }
+
+SESSION_CACHE_ALIAS = 'sessions'
+
+# KB text is cached per file version; old versions expire instead of piling up
+VOICE_KB_CACHE_TTL_S = 24 * 3600
+
+if VOICE_CACHE_URL:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+
+
+# Precomputed KB embeddings (built with `manage.py build_embeddings`)
+
+VOICE_EMBEDDINGS_DIR = Path(os.getenv('VOICE_EMBEDDINGS_DIR') or BASE_DIR / 'embeddings')
+VOICE_EMBEDDER = os.getenv('VOICE_EMBEDDER', 'src.retrieval.embeddings.HashingEmbedder')
+
+
+# Degradation under upstream slowness (see Voice_App/degradation.py)
+
+VOICE_SLO = {
+    'FILLER_AFTER_S': 1.2,          # speak a filler if no token has arrived by then
+    'FIRST_TOKEN_DEADLINE_S': 6.0,  # give up on upstream and answer from fallbacks
+    'STALL_S': 4.0,                 # max gap between tokens once streaming
+    'P95_TARGET_S': 2.5,            # shrink max_tokens / context above this rolling p95
+    'BREAKER_FAILURES': 3,
+    'BREAKER_RESET_S': 30,
+    'ANSWER_CACHE_TTL_S': 24 * 3600,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -125,6 +207,8 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Logging configuration
+# Handlers below are moved behind a queue in VoiceAppConfig.ready(), so records are
+# written by a background thread rather than on the streaming response path.
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -134,19 +218,36 @@ LOGGING = {
 
     'formatters': {
         'detailed': {
-            'format': '[%(asctime)s] %(levelname)s [%(name)s:%(lineno)s] %(message)s',
+            'format': '[%(asctime)s] %(levelname)s [%(name)s:%(lineno)s] [%(request_id)s] %(message)s',
             'datefmt': '%d/%b/%Y %H:%M:%S'
         },
+        'json': {
+            '()': 'src.config.logging_setup.JsonFormatter',
+        },
+    },
+
+    'filters': {
+        'request_context': {
+            '()': 'src.config.logging_setup.RequestContextFilter',
+        },
+        'sample_debug': {
+            '()': 'src.config.logging_setup.DebugSampleFilter',
+            'rate': 20,
+        },
     },
 
     'handlers': {
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'logging.handlers.RotatingFileHandler',
             'filename': 'voice_app.log',
-            'formatter': 'detailed',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'encoding': 'utf-8',
+            'formatter': 'json',
         },
         'console': {
+            'level': 'INFO',
             'class': 'logging.StreamHandler',
             'formatter': 'detailed',
         },
@@ -155,6 +256,7 @@ LOGGING = {
     'loggers': {
         'voice_app': {
             'handlers': ['file', 'console'],
+            'filters': ['request_context', 'sample_debug'],
             'level': 'DEBUG',
             'propagate': False,
         },
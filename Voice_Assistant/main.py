@@ -1,35 +1,43 @@
 import azure.cognitiveservices.speech as speechsdk
+import pyaudio
 from openai import AzureOpenAI
+from src.audio.vad import EnergyVAD, FRAME_MS, SAMPLE_RATE
 from src.config.config import MyConfig
+from src.config.logging_setup import DebugSampleFilter, JsonFormatter, enqueue_handlers
 from src.prompts.system_prompt import VOICE_ASSISTANT_PROMPT
+from src.speech.speakable import SpeakableSegmenter
+from src.tracing.recorder import get_recorder
 import logging
 import os
-from datetime import datetime
+import time
+from logging.handlers import RotatingFileHandler
 
 
 logs_dir = os.path.join("src","logs")
 if not os.path.exists(logs_dir):
     os.makedirs(logs_dir)
 
-# Configure logging
-log_filename = os.path.join(logs_dir, f"voice_agent.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_filename),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: JSON lines to a rotating file, plain text to the console,
+# both written from a background thread so the audio loop never waits on disk.
+log_filename = os.path.join(logs_dir, "voice_agent.log")
+file_handler = RotatingFileHandler(log_filename, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+file_handler.setFormatter(JsonFormatter())
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[file_handler, console_handler])
+enqueue_handlers(logging.getLogger())
 logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logger.addFilter(DebugSampleFilter(rate=20))
 
 # Load config
 config = MyConfig.envFile()
 
 logger.info("Checking Azure Speech Service configuration...")
-logger.info(f"Region: {config.get('SPEECH_REGION', 'NOT_SET')}")
-logger.info(f"Key present: {'Yes' if config.get('SPEECH_KEY') else 'No'}")
-logger.info(f"Key length: {len(config.get('SPEECH_KEY', '')) if config.get('SPEECH_KEY') else 0}")
+logger.info("Region: %s", config.get('SPEECH_REGION') or 'NOT_SET')
+logger.info("Key present: %s", 'Yes' if config.get('SPEECH_KEY') else 'No')
+logger.info("Key length: %d", len(config.get('SPEECH_KEY') or ''))
 
 speech_config = speechsdk.SpeechConfig(
     subscription=config["SPEECH_KEY"],
@@ -51,12 +59,60 @@ client = AzureOpenAI(
     azure_endpoint=config["AZURE_OPENAI_ENDPOINT"]
 )
 deployment_name = config["AZURE_OPENAI_DEPLOYMENT_NAME"]
-logger.info(f"Azure OpenAI deployment: {deployment_name}")
+logger.info("Azure OpenAI deployment: %s", deployment_name)
 
-# Speech recognizer + synthesizer
-speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config)
+# Speech synthesizer
 speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
 
+# Microphone capture + local endpointing. The recognizer reads from a push stream
+# that is closed as soon as the VAD decides the turn is over, instead of waiting
+# for the Speech SDK's fixed end-of-speech silence timeout.
+CHUNK_MS = 100
+NO_SPEECH_TIMEOUT_S = 5
+MAX_UTTERANCE_S = 15
+
+vad = EnergyVAD()
+mic = pyaudio.PyAudio()
+stream_format = speechsdk.audio.AudioStreamFormat(
+    samples_per_second=SAMPLE_RATE, bits_per_sample=16, channels=1
+)
+
+
+def recognize_with_vad():
+    """Stream one utterance from the microphone to the recognizer and return its result."""
+    push_stream = speechsdk.audio.PushAudioInputStream(stream_format)
+    recognizer = speechsdk.SpeechRecognizer(
+        speech_config=speech_config,
+        audio_config=speechsdk.audio.AudioConfig(stream=push_stream)
+    )
+    result_future = recognizer.recognize_once_async()
+
+    frames_per_chunk = SAMPLE_RATE * CHUNK_MS // 1000
+    mic_stream = mic.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE,
+                          input=True, frames_per_buffer=frames_per_chunk)
+    vad.reset()
+    elapsed = 0.0
+
+    try:
+        while elapsed < MAX_UTTERANCE_S:
+            data = mic_stream.read(frames_per_chunk, exception_on_overflow=False)
+            push_stream.write(data)
+            elapsed += CHUNK_MS / 1000
+
+            if any(kind == "end" for kind, _ in vad.process(data)):
+                logger.info("Local endpoint", extra={"hangover_ms": vad.hangover_frames * FRAME_MS,
+                                                     "utterance_ms": round(elapsed * 1000)})
+                break
+            if vad.speech_start is None and elapsed >= NO_SPEECH_TIMEOUT_S:
+                break
+    finally:
+        mic_stream.stop_stream()
+        mic_stream.close()
+        push_stream.close()
+
+    return result_future.get()
+
+
 print("Speak to the AI agent (say 'exit' to stop)...")
 print("Make sure your microphone is connected and working...")
 logger.info("Voice agent started")
@@ -67,13 +123,14 @@ while True:
     try:
         print("Listening...")
         logger.info("Listening for user input...")
-        result = speech_recognizer.recognize_once_async().get()
+        result = recognize_with_vad()
         
         # Check recognition result status
         if result.reason == speechsdk.ResultReason.RecognizedSpeech:
             user_text = result.text.strip()
             print(f"You said: {user_text}")
-            logger.info(f"User input recognized: {user_text}")
+            logger.info("User input recognized", extra={"chars": len(user_text)})
+            logger.debug("User input: %s", user_text)
             
             if not user_text:
                 print("No speech detected. Please speak clearly.")
@@ -87,32 +144,58 @@ while True:
                 
             # Get AI response
             logger.info("Requesting AI response...")
-            response = client.chat.completions.create(
+            llm_started = time.perf_counter()
+            messages = [
+                {"role": "system", "content": VOICE_ASSISTANT_PROMPT},
+                {"role": "user", "content": user_text}
+            ]
+            recorder = get_recorder()
+            trace = recorder.start("main", messages, params={"max_tokens": 150}) if recorder else None
+            stream = client.chat.completions.create(
                 model=deployment_name,
-                messages=[
-                    {"role": "system", "content": VOICE_ASSISTANT_PROMPT},
-                    {"role": "user", "content": user_text}
-                ],
-                max_tokens=150
+                messages=messages,
+                max_tokens=150,
+                stream=True
             )
-            
-            agent_reply = response.choices[0].message.content
+
+            # Each finished clause is queued for synthesis while the rest is still
+            # streaming, so the first words play long before the reply is complete
+            print("AI is speaking...")
+            segmenter = SpeakableSegmenter()
+            speech_futures = []
+            agent_reply = ""
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                content = chunk.choices[0].delta.content
+                agent_reply += content
+                if trace:
+                    trace.chunk(content)
+                for unit in segmenter.feed(content):
+                    speech_futures.append(speech_synthesizer.speak_text_async(unit))
+            for unit in segmenter.flush():
+                speech_futures.append(speech_synthesizer.speak_text_async(unit))
+
+            if trace:
+                trace.finish(agent_reply)
             print(f"AI: {agent_reply}")
-            logger.info(f"AI response: {agent_reply}")
-            
+            logger.info("AI response", extra={"chars": len(agent_reply),
+                                              "units": len(speech_futures),
+                                              "llm_ms": round((time.perf_counter() - llm_started) * 1000)})
+            logger.debug("AI response: %s", agent_reply)
+
             # Wait for speech synthesis to complete
-            print("AI is speaking...")
-            logger.info("Starting speech synthesis...")
-            speech_result = speech_synthesizer.speak_text_async(agent_reply).get()
-            
+            speech_results = [future.get() for future in speech_futures]
+
             # Check if speech synthesis was successful
-            if speech_result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+            canceled = [r for r in speech_results if r.reason == speechsdk.ResultReason.Canceled]
+            if not canceled:
                 print("AI finished speaking")
                 logger.info("Speech synthesis completed successfully")
-            elif speech_result.reason == speechsdk.ResultReason.Canceled:
-                cancellation_details = speech_result.cancellation_details
-                logger.error(f"Speech synthesis canceled: {cancellation_details.reason}")
-                logger.error(f"Error details: {cancellation_details.error_details}")
+            else:
+                cancellation_details = canceled[0].cancellation_details
+                logger.error("Speech synthesis canceled: %s", cancellation_details.reason)
+                logger.error("Error details: %s", cancellation_details.error_details)
                 print(f"Speech synthesis canceled: {cancellation_details.reason}")
                 print(f"Error: {cancellation_details.error_details}")
             
@@ -122,10 +205,10 @@ while True:
             
         elif result.reason == speechsdk.ResultReason.Canceled:
             cancellation_details = result.cancellation_details
-            logger.error(f"Speech recognition canceled: {cancellation_details.reason}")
+            logger.error("Speech recognition canceled: %s", cancellation_details.reason)
             print(f"Speech recognition canceled: {cancellation_details.reason}")
             if cancellation_details.reason == speechsdk.CancellationReason.Error:
-                logger.error(f"Error details: {cancellation_details.error_details}")
+                logger.error("Error details: %s", cancellation_details.error_details)
                 print(f"Error details: {cancellation_details.error_details}")
                 break
                 
@@ -134,9 +217,10 @@ while True:
         logger.info("Keyboard interrupt received - exiting gracefully")
         break
     except Exception as e:
-        logger.error(f"An error occurred: {e}", exc_info=True)
+        logger.error("An error occurred: %s", e, exc_info=True)
         print(f"An error occurred: {e}")
         break
 
+mic.terminate()
 logger.info("Voice agent stopped")
 print("Voice agent stopped")
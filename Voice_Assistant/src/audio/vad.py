@@ -0,0 +1,161 @@
+import numpy as np
+
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+
+
+def pcm_to_float(pcm):
+    """Convert 16-bit little-endian PCM bytes (or an int16 array) to float32 in [-1, 1]."""
+    if isinstance(pcm, (bytes, bytearray, memoryview)):
+        pcm = np.frombuffer(pcm, dtype="<i2")
+    return np.asarray(pcm, dtype=np.float32) / 32768.0
+
+
+def frame_features(samples, frame_len):
+    """Return per-frame energy (dBFS) and zero-crossing rate for whole frames in `samples`."""
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        empty = np.empty(0, dtype=np.float32)
+        return empty, empty
+
+    frames = samples[: n_frames * frame_len].reshape(n_frames, frame_len)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_len - 1)
+    return energy_db.astype(np.float32), zcr.astype(np.float32)
+
+
+class EnergyVAD:
+    """Streaming energy / zero-crossing voice activity detector with adaptive endpointing.
+
+    Feed raw PCM with `process()`; it returns ("start", t) and ("end", t) events where
+    `t` is the stream time in seconds. The noise floor, the speech level and the
+    end-of-turn hangover are learned from the speaker and kept across `reset()` so
+    later turns end sooner than a fixed silence timeout would allow.
+    """
+
+    def __init__(
+        self,
+        sample_rate=SAMPLE_RATE,
+        frame_ms=FRAME_MS,
+        min_margin_db=6.0,
+        max_margin_db=18.0,
+        zcr_noise=0.35,
+        min_speech_ms=100,
+        hangover_ms=700,
+        min_hangover_ms=250,
+        max_hangover_ms=1200,
+        calibration_ms=200,
+        adaptive=True,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        self.frame_s = self.frame_len / sample_rate
+        self.min_margin_db = min_margin_db
+        self.max_margin_db = max_margin_db
+        self.zcr_noise = zcr_noise
+        self.min_speech_frames = max(1, round(min_speech_ms / frame_ms))
+        self.min_hangover_frames = max(1, round(min_hangover_ms / frame_ms))
+        self.max_hangover_frames = max(self.min_hangover_frames, round(max_hangover_ms / frame_ms))
+        self.calibration_frames = round(calibration_ms / frame_ms)
+        self.adaptive = adaptive
+
+        # Learned per speaker / room, kept across turns
+        self.noise_db = -60.0
+        self.speech_db = -25.0
+        self.hangover_frames = round(hangover_ms / frame_ms)
+        self.pause_frames = None
+
+        self.reset()
+
+    # ------------------------------ STATE ------------------------------
+    def reset(self):
+        """Start a new utterance, keeping what was learned about the speaker."""
+        self._pending = np.empty(0, dtype=np.float32)
+        self._frame_index = 0
+        self._run = 0
+        self._silence = 0
+        self.in_speech = False
+        self.ended = False
+        self.speech_start = None
+        self.speech_end = None
+
+    @property
+    def threshold_db(self):
+        margin = 0.5 * (self.speech_db - self.noise_db)
+        return self.noise_db + min(max(margin, self.min_margin_db), self.max_margin_db)
+
+    # ------------------------------ STREAMING ------------------------------
+    def process(self, pcm):
+        """Consume a chunk of PCM and return the list of endpoint events it produced."""
+        samples = pcm_to_float(pcm)
+        if len(self._pending):
+            samples = np.concatenate((self._pending, samples))
+
+        energy_db, zcr = frame_features(samples, self.frame_len)
+        self._pending = samples[len(energy_db) * self.frame_len:]
+
+        events = []
+        for e, z in zip(energy_db.tolist(), zcr.tolist()):
+            event = self._step(e, z)
+            if event:
+                events.append(event)
+            self._frame_index += 1
+        return events
+
+    def _step(self, energy_db, zcr):
+        # The first frames the detector ever sees are taken as room noise
+        if self.calibration_frames > 0:
+            self.calibration_frames -= 1
+            self.noise_db = energy_db if self._frame_index == 0 else 0.7 * self.noise_db + 0.3 * energy_db
+            return None
+
+        # Hiss and breath are noisy (high ZCR) but quiet; loud frames count regardless
+        voiced = energy_db > self.threshold_db and (
+            zcr < self.zcr_noise or energy_db > self.threshold_db + self.min_margin_db
+        )
+
+        if not voiced:
+            self.noise_db += (0.05 if energy_db < self.noise_db + 3 else 0.01) * (energy_db - self.noise_db)
+        elif self.in_speech:
+            self.speech_db += 0.05 * (energy_db - self.speech_db)
+
+        if self.ended:
+            return None
+
+        t = self._frame_index * self.frame_s
+
+        if not self.in_speech:
+            self._run = self._run + 1 if voiced else 0
+            if self._run >= self.min_speech_frames:
+                self.in_speech = True
+                self._silence = 0
+                self.speech_start = t - (self._run - 1) * self.frame_s
+                return ("start", self.speech_start)
+            return None
+
+        if voiced:
+            if self._silence:
+                self._learn_pause(self._silence)
+            self._silence = 0
+            return None
+
+        self._silence += 1
+        if self._silence >= self.hangover_frames:
+            self.ended = True
+            self.in_speech = False
+            self.speech_end = t - (self._silence - 1) * self.frame_s
+            return ("end", t + self.frame_s)
+        return None
+
+    def _learn_pause(self, frames):
+        """Fit the hangover to the speaker's own within-utterance pauses."""
+        if not self.adaptive or frames < 3:
+            return
+        if self.pause_frames is None:
+            self.pause_frames = float(frames)
+        else:
+            self.pause_frames += 0.2 * (frames - self.pause_frames)
+        target = 1.5 * self.pause_frames + 5
+        self.hangover_frames = int(min(max(target, self.min_hangover_frames), self.max_hangover_frames))
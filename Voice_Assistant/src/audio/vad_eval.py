@@ -0,0 +1,131 @@
+"""Offline endpointing evaluation for the desktop agent's VAD.
+
+Runs EnergyVAD over WAV fixtures as if they were streamed from the microphone and
+reports how long after the real end of speech each turn was closed, and how often
+a turn was cut off while the speaker was still talking.
+
+Each fixture is a 16-bit WAV file with a JSON sidecar of the same name holding the
+labelled end of speech in seconds, e.g. `hours.wav` + `hours.json`:
+
+    {"speech_end": 1.84}
+
+Usage:
+    python -m src.audio.vad_eval path/to/fixtures [--session] [--fixed-hangover-ms 700]
+"""
+import argparse
+import json
+import wave
+from pathlib import Path
+
+import numpy as np
+
+from src.audio.vad import EnergyVAD, FRAME_MS, SAMPLE_RATE
+
+
+CHUNK_MS = 100  # matches the capture buffer size used in main.py
+
+
+def read_wav(path):
+    """Return mono int16 samples and the sample rate of a 16-bit WAV file."""
+    with wave.open(str(path), "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        channels = wf.getnchannels()
+        rate = wf.getframerate()
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype="<i2")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, rate
+
+
+def load_fixtures(fixture_dir):
+    fixtures = []
+    for wav_path in sorted(Path(fixture_dir).glob("*.wav")):
+        label_path = wav_path.with_suffix(".json")
+        if not label_path.exists():
+            continue
+        label = json.loads(label_path.read_text("utf8"))
+        fixtures.append((wav_path, float(label["speech_end"])))
+    return fixtures
+
+
+def run_fixture(vad, samples, rate, chunk_ms=CHUNK_MS):
+    """Stream `samples` through `vad` and return the time the turn was closed (or None)."""
+    vad.reset()
+    chunk = int(rate * chunk_ms / 1000)
+    for offset in range(0, len(samples), chunk):
+        for kind, t in vad.process(samples[offset:offset + chunk]):
+            if kind == "end":
+                return t
+    return None
+
+
+def evaluate(fixtures, make_vad, session=False, cutoff_tolerance_s=0.05):
+    vad = make_vad()
+    rows = []
+
+    for wav_path, speech_end in fixtures:
+        samples, rate = read_wav(wav_path)
+        if not session:
+            vad = make_vad()
+        if vad.sample_rate != rate:
+            vad = make_vad(sample_rate=rate)
+
+        closed_at = run_fixture(vad, samples, rate)
+        duration = len(samples) / rate
+        if closed_at is None:
+            # Never closed: the recognizer would have waited until the stream ended
+            closed_at = duration
+
+        rows.append({
+            "file": wav_path.name,
+            "speech_end": speech_end,
+            "closed_at": round(closed_at, 3),
+            "latency_ms": round((closed_at - speech_end) * 1000),
+            "cut_off": closed_at < speech_end - cutoff_tolerance_s,
+            "hangover_ms": vad.hangover_frames * FRAME_MS,
+        })
+
+    return rows
+
+
+def summarize(rows):
+    if not rows:
+        return {"files": 0}
+    ok = np.array([r["latency_ms"] for r in rows if not r["cut_off"]], dtype=np.float64)
+    cut_offs = sum(r["cut_off"] for r in rows)
+    summary = {"files": len(rows), "false_cutoff_rate": round(cut_offs / len(rows), 3)}
+    if len(ok):
+        summary.update({
+            "latency_ms_mean": round(float(ok.mean())),
+            "latency_ms_p50": round(float(np.percentile(ok, 50))),
+            "latency_ms_p90": round(float(np.percentile(ok, 90))),
+        })
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate VAD endpointing on WAV fixtures.")
+    parser.add_argument("fixtures", help="Directory of *.wav files with *.json speech_end labels")
+    parser.add_argument("--session", action="store_true",
+                        help="Reuse one detector across files, as for a single speaker")
+    parser.add_argument("--fixed-hangover-ms", type=int,
+                        help="Disable adaptation and use this fixed end-of-speech silence")
+    parser.add_argument("--verbose", action="store_true", help="Print one line per file")
+    args = parser.parse_args(argv)
+
+    def make_vad(sample_rate=SAMPLE_RATE):
+        if args.fixed_hangover_ms:
+            return EnergyVAD(sample_rate=sample_rate, hangover_ms=args.fixed_hangover_ms, adaptive=False)
+        return EnergyVAD(sample_rate=sample_rate)
+
+    rows = evaluate(load_fixtures(args.fixtures), make_vad, session=args.session)
+    if args.verbose:
+        for row in rows:
+            print(json.dumps(row))
+    print(json.dumps(summarize(rows), indent=2))
+
+
+if __name__ == "__main__":
+    main()
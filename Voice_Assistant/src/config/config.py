@@ -22,4 +22,7 @@ class MyConfig:
 
             # Optional: Gemini
             "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY"),
+
+            # Optional: directory for per-turn replay traces (disabled when unset)
+            "VOICE_TRACE_DIR": os.getenv("VOICE_TRACE_DIR"),
         }
@@ -0,0 +1,101 @@
+"""Logging helpers shared by the Django app and the desktop agent.
+
+Handlers declared in config are moved behind a queue by `enqueue_handlers()`, so the
+request / audio path only pays for putting a record on a queue; formatting and disk
+I/O happen on a background listener thread.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request ID; attach to a logger so it runs on the caller's thread."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSampleFilter(logging.Filter):
+    """Keep 1 in `rate` DEBUG records per message template; other levels always pass."""
+
+    def __init__(self, rate=10):
+        super().__init__()
+        self.rate = max(1, int(rate))
+        self._counts = {}
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG or self.rate == 1:
+            return True
+        key = (record.name, record.msg)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.rate == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including request ID and any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock `prepare()` runs the full formatter on the caller; here only the
+    message arguments are merged so the record is safe to hand to another thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _Listener(QueueListener):
+    def stop(self):
+        # Safe to call more than once (explicit close, then again at exit)
+        if self._thread is not None:
+            super().stop()
+
+
+def enqueue_handlers(logger):
+    """Replace `logger`'s handlers with a queue feeding them from a background thread."""
+    handlers = [h for h in logger.handlers if not isinstance(h, QueueHandler)]
+    if not handlers:
+        return None
+
+    log_queue = queue.SimpleQueue()
+    listener = _Listener(log_queue, *handlers, respect_handler_level=True)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
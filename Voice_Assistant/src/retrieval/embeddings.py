@@ -0,0 +1,202 @@
+"""Precomputed embeddings for KB and department matching.
+
+`manage.py build_embeddings` chunks the knowledge base and writes two files:
+
+    vectors.npy   (n_chunks, dim) float16/float32, L2-normalised rows
+    meta.json     embedder, dim, dtype and one record per chunk (domain, source, title, text)
+
+`EmbeddingStore.load()` memory-maps vectors.npy, so every worker shares the same
+pages through the OS page cache and startup costs almost nothing.
+"""
+import importlib
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.json"
+SEARCH_BLOCK_ROWS = 65536
+NO_TREATMENTS = "No treatment information available"
+
+
+# ------------------------------ EMBEDDERS ------------------------------
+class HashingEmbedder:
+    """Dependency-free local embedder: signed feature hashing of words and character trigrams.
+
+    Not semantic in the neural sense, but stable, fast and good at matching the
+    names, departments and terms users actually say. Any object with `name`,
+    `dim` and `embed(texts) -> (n, dim) float32` can be used instead.
+    """
+
+    name = "hashing-v1"
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        text = text.lower()
+        words = re.findall(r"\w+", text)
+        grams = [w[i:i + 3] for w in words if len(w) > 3 for i in range(len(w) - 2)]
+        return words + grams
+
+    def embed(self, texts):
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            hashes = np.fromiter((zlib.crc32(f.encode("utf8")) for f in self._features(text)), dtype=np.uint32)
+            rows.append(np.full(len(hashes), row))
+            cols.append(hashes % self.dim)
+            signs.append(np.where(hashes & 0x80000000, -1.0, 1.0))
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(vectors, (np.concatenate(rows), np.concatenate(cols)), np.concatenate(signs))
+        return _normalize(vectors)
+
+
+def load_embedder(path, **kwargs):
+    """Instantiate an embedder from a dotted path like 'src.retrieval.embeddings.HashingEmbedder'."""
+    module_name, _, attr = path.rpartition(".")
+    return getattr(importlib.import_module(module_name), attr)(**kwargs)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ------------------------------ CHUNKING ------------------------------
+def chunk_markdown(text, domain, source, max_chars=800):
+    """Split markdown at headings, then pack paragraphs into chunks of at most `max_chars`."""
+    chunks = []
+    title = ""
+    for section in re.split(r"(?m)^(?=#{1,6}\s)", text):
+        lines = section.strip().splitlines()
+        if not lines:
+            continue
+        if lines[0].startswith("#"):
+            title = lines[0].lstrip("#").strip()
+            lines = lines[1:]
+
+        current = ""
+        for para in re.split(r"\n\s*\n", "\n".join(lines)):
+            para = para.strip()
+            if not para:
+                continue
+            if current and len(current) + len(para) + 2 > max_chars:
+                chunks.append({"domain": domain, "source": source, "title": title, "text": current})
+                current = ""
+            current = f"{current}\n\n{para}" if current else para
+        if current:
+            chunks.append({"domain": domain, "source": source, "title": title, "text": current})
+    return chunks
+
+
+def chunk_departments(data, domain, source, max_chars=800):
+    """One chunk per department (split if long) from the scraper's JSON output."""
+    chunks = []
+    for name, info in data.items():
+        doctors = ", ".join(
+            f"{d['name']} ({d['qualification']})" if d.get("qualification") else d["name"]
+            for d in info.get("doctors", [])
+        )
+        # scrap.py writes {"english", "hindi"} dicts, with a placeholder when nothing was found
+        treatments = ", ".join(
+            name for name in (t.get("english", "") if isinstance(t, dict) else t for t in info.get("treatments", []))
+            if name and name != NO_TREATMENTS
+        )
+        text = f"Department: {name}."
+        if doctors:
+            text += f" Doctors: {doctors}."
+        if treatments:
+            text += f" Treatments: {treatments}."
+
+        for start in range(0, len(text), max_chars):
+            chunks.append({"domain": domain, "source": source, "title": name, "text": text[start:start + max_chars]})
+    return chunks
+
+
+# ------------------------------ STORE ------------------------------
+class StoreMismatchError(ValueError):
+    """vectors.npy and meta.json come from different builds."""
+
+
+class EmbeddingStore:
+    def __init__(self, vectors, meta):
+        self.vectors = vectors
+        self.meta = meta
+        self.chunks = meta["chunks"]
+        self._domains = np.array([c["domain"] for c in self.chunks])
+
+    @classmethod
+    def build(cls, chunks, embedder, out_dir, dtype="float16", batch_size=256):
+        """Embed `chunks` and write vectors + metadata to `out_dir`.
+
+        Each file is replaced atomically, but not both together; `load()` rejects
+        a vectors/metadata pair from different builds.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        vec_tmp = os.path.join(out_dir, VECTORS_FILE + ".tmp")
+        meta_tmp = os.path.join(out_dir, META_FILE + ".tmp")
+
+        # open_memmap writes a regular .npy header, so the file loads with mmap_mode
+        vectors = np.lib.format.open_memmap(vec_tmp, mode="w+", dtype=dtype, shape=(len(chunks), embedder.dim))
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            vectors[start:start + len(batch)] = embedder.embed([f"{c['title']}\n{c['text']}" for c in batch])
+        vectors.flush()
+        del vectors
+
+        meta = {"embedder": embedder.name, "dim": embedder.dim, "dtype": dtype, "count": len(chunks),
+                "chunks": [dict(c, id=i) for i, c in enumerate(chunks)]}
+        with open(meta_tmp, "w", encoding="utf8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        os.replace(vec_tmp, os.path.join(out_dir, VECTORS_FILE))
+        os.replace(meta_tmp, os.path.join(out_dir, META_FILE))
+        return cls.load(out_dir)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, META_FILE), encoding="utf8") as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        # The two files are replaced one after the other, so a load can land between them
+        if vectors.shape != (meta["count"], meta["dim"]):
+            raise StoreMismatchError(
+                f"{VECTORS_FILE} has shape {vectors.shape} but {META_FILE} describes "
+                f"({meta['count']}, {meta['dim']}); the store is mid-rebuild."
+            )
+        return cls(vectors, meta)
+
+    def search(self, query_vectors, k=3, domain=None):
+        """Top-k cosine matches per query row, as lists of (score, chunk) pairs."""
+        query_vectors = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        scores = np.empty((len(query_vectors), len(self.chunks)), dtype=np.float32)
+        # Blocked so float16 rows are widened a slice at a time, not all at once
+        for start in range(0, len(self.chunks), SEARCH_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = query_vectors @ block.T
+        if domain is not None:
+            scores[:, self._domains != domain] = -np.inf
+
+        k = min(k, len(self.chunks))
+        if k == 0:
+            return [[] for _ in query_vectors]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, idx in zip(scores, top):
+            idx = idx[np.argsort(-row[idx])]
+            results.append([(float(row[i]), self.chunks[i]) for i in idx if np.isfinite(row[i])])
+        return results
+
+    def query(self, embedder, text, k=3, domain=None):
+        if embedder.name != self.meta["embedder"] or embedder.dim != self.meta["dim"]:
+            raise ValueError(
+                f"Store was built with {self.meta['embedder']}/{self.meta['dim']}, "
+                f"not {embedder.name}/{embedder.dim}; rebuild it with build_embeddings."
+            )
+        return self.search(embedder.embed([text]), k=k, domain=domain)[0]
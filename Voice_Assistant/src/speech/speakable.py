@@ -0,0 +1,221 @@
+"""Turn streamed LLM text into short, speakable units for TTS.
+
+`SpeakableSegmenter.feed()` takes raw token text as it arrives and returns every
+clause that is complete so far, already cleaned for speech: markdown and stray
+symbols removed, numbers, times and currency spelled out. `flush()` returns
+whatever is left at the end of the stream.
+"""
+import re
+import unicodedata
+
+
+_ONES = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+         "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+         "seventeen", "eighteen", "nineteen"]
+_TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+_SCALES = [(10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand"), (100, "hundred")]
+_ORDINALS = {"one": "first", "two": "second", "three": "third", "five": "fifth",
+             "eight": "eighth", "nine": "ninth", "twelve": "twelfth"}
+
+# Characters that may follow clause-ending punctuation and belong to the clause
+_CLOSERS = "*_`)]\"'”’"
+
+# Words ending in "." that don't end a sentence
+_ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "st", "no", "vs", "rs", "sr", "jr", "prof", "dept", "approx", "etc"}
+
+
+def number_to_words(n):
+    """Spell out a non-negative integer, e.g. 1205 -> 'one thousand two hundred five'."""
+    if n < 20:
+        return _ONES[n]
+    if n < 100:
+        tens, ones = divmod(n, 10)
+        return _TENS[tens] + (f" {_ONES[ones]}" if ones else "")
+    for value, name in _SCALES:
+        if n >= value:
+            head, rest = divmod(n, value)
+            words = f"{number_to_words(head)} {name}"
+            return words + (f" {number_to_words(rest)}" if rest else "")
+    return str(n)
+
+
+def ordinal_to_words(n):
+    words = number_to_words(n).split(" ")
+    last = words[-1]
+    if last in _ORDINALS:
+        words[-1] = _ORDINALS[last]
+    elif last.endswith("y"):
+        words[-1] = last[:-1] + "ieth"
+    else:
+        words[-1] = last + "th"
+    return " ".join(words)
+
+
+# ------------------------------ NORMALIZATION ------------------------------
+def _time(match):
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+    words = number_to_words(hour)
+    if minute:
+        words += (" oh " if minute < 10 else " ") + number_to_words(minute)
+    if meridiem:
+        words += f" {meridiem.upper()} M"
+    return words
+
+
+def _plain_number(text):
+    digits = text.replace(",", "")
+    if "." in digits:
+        whole, frac = digits.split(".", 1)
+        return number_to_words(int(whole or 0)) + " point " + _digits(frac)
+    if len(digits) >= 7 and "," not in text:
+        # Phone numbers and IDs are read digit by digit
+        return _digits(digits)
+    return number_to_words(int(digits))
+
+
+def _digits(text):
+    return " ".join(_ONES[int(d)] for d in text)
+
+
+def _phone(match):
+    """Read hyphen/space separated digit groups digit by digit if they look like a phone number."""
+    groups = re.split(r"[- ]", match.group(0))
+    longest = max(map(len, groups))
+    # Room lists ("101 102 103") and ranges ("1000-2000") stay numbers
+    phone_like = groups[0].startswith("0") or (
+        sum(map(len, groups)) >= 7 and (longest >= 5 or (len(groups) > 2 and longest >= 4))
+    )
+    if not phone_like:
+        return match.group(0)
+    return ", ".join(_digits(group) for group in groups)
+
+
+_MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+           "August", "September", "October", "November", "December"]
+
+
+def _iso_date(match):
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return _digits(match.group(0).replace("-", ""))
+    return f"{ordinal_to_words(day)} {_MONTHS[month - 1]} {number_to_words(year)}"
+
+
+# Commas only as thousands separators: 12,345 or the Indian 1,00,000
+_NUMBER = r"(?:\d{1,2}(?:,\d{2})+,\d{3}|\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?"
+
+_MARKDOWN = [
+    (re.compile(r"\[([^\]]*)\]\([^)]*\)"), r"\1"),    # [text](url)
+    (re.compile(r"^\s*#{1,6}\s*"), ""),                # headings
+    (re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+"), ""),     # list bullets
+    (re.compile(r"(\*\*|__|\*|`+|~~)"), ""),           # emphasis / code
+    (re.compile(r"(?<!\w)_|_(?!\w)"), ""),
+]
+
+_SPEECH_RULES = [
+    (re.compile(r"\b(\d{1,2}):(\d{2})\s*([AaPp])\.?\s*[Mm]\b"), _time),
+    (re.compile(r"\b(\d{1,2})\s*(?:-|–|to)\s*(\d{1,2})\s*([AaPp])\.?\s*[Mm]\b"),
+     lambda m: f"{number_to_words(int(m.group(1)))} to {number_to_words(int(m.group(2)))} {m.group(3).upper()} M"),
+    (re.compile(r"\b(\d{1,2})\s*([AaPp])\.?\s*[Mm]\b"),
+     lambda m: f"{number_to_words(int(m.group(1)))} {m.group(2).upper()} M"),
+    (re.compile(r"\b(\d{1,2}):(\d{2})()\b"), _time),
+    (re.compile(r"\b24\s*/\s*7\b"), "twenty four seven"),
+    (re.compile(rf"(?:₹|\bRs\.?|\bINR)\s*({_NUMBER})"), lambda m: f"{_plain_number(m.group(1))} rupees"),
+    (re.compile(rf"\$\s*({_NUMBER})"), lambda m: f"{_plain_number(m.group(1))} dollars"),
+    (re.compile(rf"({_NUMBER})\s*%"), lambda m: f"{_plain_number(m.group(1))} percent"),
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), _iso_date),
+    (re.compile(r"\b\d{3,}(?:[- ]\d{3,})+\b"), _phone),
+    (re.compile(r"\b(0|[1-9]\d{0,3})\s*(?:-|–|to)\s*([1-9]\d{0,3})\b"),
+     lambda m: f"{number_to_words(int(m.group(1)))} to {number_to_words(int(m.group(2)))}"),
+    (re.compile(r"\b(\d+)(?:st|nd|rd|th)\b"), lambda m: ordinal_to_words(int(m.group(1)))),
+    (re.compile(rf"\b{_NUMBER}\b"), lambda m: _plain_number(m.group(0))),
+    (re.compile(r"\s*&\s*"), " and "),
+    (re.compile(r"\s*\+\s*"), " plus "),
+    (re.compile(r"\s*@\s*"), " at "),
+]
+
+
+def normalize_for_speech(text):
+    """Clean one unit of text so a TTS engine reads it naturally."""
+    for pattern, repl in _MARKDOWN:
+        text = pattern.sub(repl, text)
+    for pattern, repl in _SPEECH_RULES:
+        text = pattern.sub(repl, text)
+    # Emoji and other pictographs are either skipped or read out by name
+    text = "".join(ch for ch in text if unicodedata.category(ch) not in ("So", "Sk", "Cs", "Co"))
+    text = re.sub(r"[|<>{}\[\]\\^=]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# ------------------------------ SEGMENTATION ------------------------------
+class SpeakableSegmenter:
+    """Split streamed text into speakable units at clause boundaries.
+
+    A unit ends at a newline, at . ! ? ; or : followed by whitespace, or at a comma
+    once the unit is at least `min_chars` long. Units longer than `max_chars` are
+    cut at the last space so TTS never waits on a run-on sentence.
+    """
+
+    def __init__(self, min_chars=24, max_chars=160):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        units = []
+        while True:
+            cut = self._next_boundary()
+            if cut is None:
+                break
+            unit, self._buffer = self._buffer[:cut], self._buffer[cut:]
+            units.extend(self._emit(unit))
+        return units
+
+    def flush(self):
+        unit, self._buffer = self._buffer, ""
+        return self._emit(unit)
+
+    def _emit(self, raw):
+        unit = normalize_for_speech(raw)
+        # Drop units with nothing to say (e.g. a bare bullet or separator)
+        return [unit] if any(ch.isalnum() for ch in unit) else []
+
+    def _next_boundary(self):
+        buf = self._buffer
+        for i, ch in enumerate(buf):
+            if ch == "\n":
+                return i + 1
+            if ch not in ".!?;:,":
+                continue
+
+            # Closing quotes, brackets and markdown stay with the clause they end
+            end = i + 1
+            while end < len(buf) and buf[end] in _CLOSERS:
+                end += 1
+            if end == len(buf):
+                # Can't tell yet whether this ends the clause; wait for more text
+                return None
+            if not buf[end].isspace():
+                continue
+
+            if ch == ",":
+                if len(buf[:i].strip()) >= self.min_chars:
+                    return end
+            elif ch == "." and self._is_abbreviation(buf[:i]):
+                continue
+            elif ch == "." and buf[:i].rsplit("\n", 1)[-1].strip().isdigit():
+                continue  # numbered list marker
+            else:
+                return end
+
+        if len(buf) > self.max_chars:
+            space = buf.rfind(" ", 0, self.max_chars)
+            return space + 1 if space > 0 else self.max_chars
+        return None
+
+    @staticmethod
+    def _is_abbreviation(before):
+        match = re.search(r"(\w+)$", before)
+        word = match.group(1).lower() if match else ""
+        return word in _ABBREVIATIONS or (len(word) == 1 and word.isalpha())
@@ -0,0 +1,228 @@
+"""A local stand-in for the Azure OpenAI chat completions endpoint.
+
+Serves `POST .../chat/completions` on 127.0.0.1 and streams whatever the responder
+returns, with the chunk timing it asks for. Used for trace replay, for running
+the app without network access, and for fault injection (slow first token,
+error statuses, connections dropped mid-stream).
+
+    with FakeUpstream(fixed_responder("Room 12.", ttft_ms=200)) as upstream, upstream.environ():
+        ...  # anything built from MyConfig.envFile() now talks to the fake
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.tracing.recorder import prompt_hash
+
+
+class FakeResponse:
+    """What the fake upstream should send back for one request.
+
+    `chunks` is a list of (offset_ms, text) pairs, offsets measured from when the
+    request arrived. A non-200 `status` answers with an error body instead, and
+    `drop_after` closes the connection after that many chunks without finishing.
+    """
+
+    def __init__(self, chunks, status=200, drop_after=None):
+        self.chunks = chunks
+        self.status = status
+        self.drop_after = drop_after
+
+    @property
+    def text(self):
+        return "".join(text for _, text in self.chunks)
+
+
+def fixed_responder(text, ttft_ms=0, chunk_ms=0, words_per_chunk=1):
+    """Answer every request with `text`, split into word chunks at a steady rate."""
+    words = text.split(" ")
+    pieces = [" ".join(words[i:i + words_per_chunk]) for i in range(0, len(words), words_per_chunk)]
+    pieces = [p if i == 0 else " " + p for i, p in enumerate(pieces)]
+    response = FakeResponse([(ttft_ms + i * chunk_ms, p) for i, p in enumerate(pieces)])
+    return lambda body: response
+
+
+def sequence_responder(responses):
+    """Answer successive requests with `responses` in order, repeating the last one."""
+    lock = threading.Lock()
+    remaining = list(responses)
+
+    def respond(body):
+        with lock:
+            return remaining.pop(0) if len(remaining) > 1 else remaining[0]
+    return respond
+
+
+class ReplayResponder:
+    """Reproduce recorded traces: match by prompt hash, then by user text."""
+
+    def __init__(self, traces, speed=1.0, default=None):
+        self.speed = speed
+        self.default = default or FakeResponse([(0, "Sorry, I don't have that information.")])
+        self._by_hash = {}
+        self._by_text = {}
+        for trace in traces:
+            self._by_hash.setdefault(trace["prompt_hash"], trace)
+            self._by_text.setdefault(trace["text"], trace)
+        self.misses = 0
+
+    def __call__(self, body):
+        messages = body.get("messages", [])
+        trace = self._by_hash.get(prompt_hash(messages))
+        if trace is None and messages:
+            trace = self._by_text.get(messages[-1]["content"])
+        if trace is None:
+            self.misses += 1
+            return self.default
+        if trace.get("error") and not trace["chunks"]:
+            return FakeResponse([], status=500)
+        return FakeResponse([(ms / self.speed, text) for ms, text in trace["chunks"]])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        arrived = time.perf_counter()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        upstream = self.server.upstream
+        upstream.requests.append(body)
+
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "not found"}})
+
+        response = upstream.responder(body)
+        if response.status != 200:
+            return self._send_json(response.status, {"error": {"message": "fake upstream failure"}})
+
+        if body.get("stream"):
+            self._stream(body, response, arrived)
+        else:
+            self._wait_until(arrived, response.chunks[-1][0] if response.chunks else 0)
+            self._send_json(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": response.text},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage(body, response),
+            })
+
+    def _wait_until(self, arrived, offset_ms):
+        delay = arrived + offset_ms / 1000 - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _event(self, body, delta, finish_reason=None, usage=None):
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage:
+            payload["usage"] = usage
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf8"))
+
+    def _stream(self, body, response, arrived):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        try:
+            for i, (offset_ms, text) in enumerate(response.chunks):
+                if i == response.drop_after:
+                    self.close_connection = True
+                    return
+                self._wait_until(arrived, offset_ms)
+                self._event(body, {"role": "assistant", "content": text})
+            self._event(body, {}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._event(body, {}, usage=_usage(body, response))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def _usage(body, response):
+    # Rough 4-chars-per-token estimate; good enough for relative comparisons
+    prompt = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+    completion = len(response.text) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class FakeUpstream:
+    """Threaded fake chat completions server; use as a context manager."""
+
+    def __init__(self, responder, host="127.0.0.1", port=0):
+        self.responder = responder
+        self.requests = []
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.upstream = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @contextlib.contextmanager
+    def environ(self):
+        """Point the Azure OpenAI settings read by MyConfig at this server."""
+        overrides = {
+            "AZURE_OPENAI_ENDPOINT": self.url,
+            "AZURE_OPENAI_KEY": "fake-key",
+            "AZURE_OPENAI_API_VERSION": os.getenv("AZURE_OPENAI_API_VERSION") or "2024-02-01",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME") or "fake-deployment",
+        }
+        saved = {key: os.environ.get(key) for key in overrides}
+        os.environ.update(overrides)
+        try:
+            yield self
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,127 @@
+"""Per-turn request traces for offline replay.
+
+Set VOICE_TRACE_DIR to enable. Each finished turn is appended as one JSON line to
+`<VOICE_TRACE_DIR>/traces-<source>.jsonl`:
+
+    {"source": "api_ask", "ts": ..., "request_id": ..., "domain": "finance",
+     "text": "...", "history": [...], "prompt_hash": "...", "prompt_chars": 1234,
+     "params": {"max_tokens": 80, "temperature": 0.7},
+     "chunks": [[312, "Hello"], [340, " there"]], "ttft_ms": 312, "total_ms": 590,
+     "output": "Hello there", "error": null}
+
+Chunk offsets are milliseconds from the upstream call. Lines go through a queued
+logging handler, so recording never blocks the response on disk I/O.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from src.config.config import MyConfig
+from src.config.logging_setup import enqueue_handlers, request_id_var
+
+
+def prompt_hash(messages):
+    """Stable short hash of the exact message list sent upstream."""
+    blob = json.dumps(messages, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf8")).hexdigest()[:16]
+
+
+def load_traces(paths):
+    traces = []
+    for path in paths:
+        with open(path, encoding="utf8") as f:
+            traces.extend(json.loads(line) for line in f if line.strip())
+    return traces
+
+
+class TurnTrace:
+    def __init__(self, logger, source, messages, domain, params):
+        self._logger = logger
+        self._started = time.perf_counter()
+        self.data = {
+            "source": source,
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "request_id": request_id_var.get(),
+            "domain": domain,
+            "text": messages[-1]["content"],
+            "history": messages[1:-1],
+            "prompt_hash": prompt_hash(messages),
+            "prompt_chars": sum(len(m["content"]) for m in messages),
+            "params": params,
+            "chunks": [],
+        }
+
+    def _elapsed_ms(self):
+        return round((time.perf_counter() - self._started) * 1000)
+
+    def chunk(self, text):
+        self.data["chunks"].append([self._elapsed_ms(), text])
+
+    def finish(self, output, error=None):
+        chunks = self.data["chunks"]
+        self.data.update({
+            "ttft_ms": chunks[0][0] if chunks else None,
+            "total_ms": self._elapsed_ms(),
+            "output": output,
+            "error": error,
+        })
+        self._logger.info(json.dumps(self.data, ensure_ascii=False))
+
+
+class TraceRecorder:
+    """Hands out TurnTrace objects writing to `traces-<source>.jsonl` under `trace_dir`."""
+
+    def __init__(self, trace_dir):
+        self.trace_dir = trace_dir
+        self._loggers = {}
+        self._listeners = []
+
+    def _logger_for(self, source):
+        if source not in self._loggers:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            handler = RotatingFileHandler(
+                os.path.join(self.trace_dir, f"traces-{source}.jsonl"),
+                maxBytes=50 * 1024 * 1024, backupCount=5, encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger(f"voice_trace.{source}")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            for old in list(logger.handlers):
+                logger.removeHandler(old)
+            logger.addHandler(handler)
+            self._listeners.append(enqueue_handlers(logger))
+            self._loggers[source] = logger
+        return self._loggers[source]
+
+    def close(self):
+        """Flush pending traces and release the files."""
+        for listener in self._listeners:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        self._listeners.clear()
+        self._loggers.clear()
+
+    def start(self, source, messages, domain=None, params=None):
+        return TurnTrace(self._logger_for(source), source, messages, domain, params or {})
+
+
+_recorder = None
+
+
+def get_recorder():
+    """Return the process-wide recorder, or None when VOICE_TRACE_DIR is not set."""
+    global _recorder
+    trace_dir = MyConfig.envFile()["VOICE_TRACE_DIR"]
+    if not trace_dir:
+        return None
+    if _recorder is None or _recorder.trace_dir != trace_dir:
+        if _recorder is not None:
+            _recorder.close()
+        _recorder = TraceRecorder(trace_dir)
+    return _recorder